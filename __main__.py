@@ -1,5 +1,6 @@
-from src.game import Game
-from copy import deepcopy
+from src.experiment import run_experiments, summarize
+from src.policy_cache import PolicyCache
+from src.maps import DEFAULT_MAP, load_map, save_map, building_map
 import argparse
 
 # Define game constants
@@ -8,40 +9,15 @@ FIRE = "F"
 WALL = "="
 PACMAN = "P"
 
-game_map = [
-    ['=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '='],
-    ['=', 'S', ' ', ' ', ' ', '=', 'P', ' ', ' ', ' ', 'P', ' ', '=', ' ', ' ', ' ', ' ', 'S', '='],
-    ['=', ' ', ' ', 'P', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '=', ' ', ' ', ' ', '=', ' ', '='],
-    ['=', ' ', ' ', ' ', ' ', '=', ' ', ' ', ' ', ' ', ' ', ' ', '=', 'P', 'P', ' ', ' ', ' ', '='],
-    ['=', ' ', ' ', ' ', 'P', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '=', ' ', ' ', 'P', 'P', ' ', '='],
-    ['=', ' ', ' ', ' ', 'P', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '=', '=', ' ', 'P', 'P', ' ', '='],
-    ['=', ' ', ' ', ' ', 'P', ' ', ' ', 'P', ' ', ' ', ' ', ' ', '=', '=', '=', ' ', ' ', ' ', '='],
-    ['=', 'P', '=', '=', '=', '=', ' ', ' ', '=', ' ', ' ', ' ', '=', '=', ' ', ' ', ' ', 'P', '='],
-    ['=', ' ', '=', ' ', ' ', '=', ' ', '=', '=', ' ', ' ', ' ', '=', ' ', ' ', ' ', ' ', ' ', '='],
-    ['=', ' ', '=', ' ', ' ', '=', ' ', '=', '=', 'P', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '='],
-    ['=', ' ', '=', '=', ' ', '=', ' ', ' ', '=', '=', 'F', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '='],
-    ['=', ' ', '=', '=', ' ', '=', ' ', ' ', '=', '=', 'P', ' ', ' ', ' ', ' ', ' ', ' ', '=', '='],
-    ['=', 'P', '=', ' ', ' ', '=', ' ', '=', '=', 'P', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '=', '='],
-    ['=', ' ', '=', ' ', ' ', '=', ' ', '=', '=', ' ', ' ', ' ', ' ', '=', ' ', 'P', '=', 'P', '='],
-    ['=', ' ', ' ', ' ', 'P', 'P', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '=', ' ', '=', ' ', ' ', '='],
-    ['=', ' ', ' ', ' ', 'P', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '=', '=', '=', ' ', ' ', ' ', '='],
-    ['=', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '=', '=', ' ', ' ', ' ', '='],
-    ['=', ' ', ' ', ' ', ' ', '=', '=', ' ', 'P', ' ', ' ', ' ', ' ', '=', ' ', ' ', ' ', ' ', '='],
-    ['=', ' ', 'P', ' ', ' ', '=', '=', ' ', 'P', ' ', ' ', ' ', ' ', '=', ' ', ' ', ' ', ' ', '='],
-    ['=', ' ', 'P', ' ', ' ', ' ', ' ', ' ', '=', '=', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '='],
-    ['=', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '=', '=', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '='],
-    ['=', 'S', ' ', ' ', ' ', 'P', ' ', ' ', '=', '=', 'P', ' ', ' ', ' ', ' ', ' ', ' ', 'S', '='],
-    ['=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=']]
-
 def parse_args():
     parser = argparse.ArgumentParser(description="Evacuation Strategy Experiment")
 
     parser.add_argument(
         "--method", 
         type=str, 
-        choices=["MCTS", "Random", "Qlearning", "AStar"], 
+        choices=["MCTS", "Random", "Qlearning", "AStar", "SpaceTimeAStar", "FlowField"], 
         required=True, 
-        help="Choose the method: MCTS, Random, Astar, or Qlearning"
+        help="Choose the method: MCTS, Random, Astar, SpaceTimeAStar, FlowField, or Qlearning"
     )
     parser.add_argument(
         "--rollout", 
@@ -55,30 +31,216 @@ def parse_args():
         default=7, 
         help="End tick for MCTS"
     )
+    parser.add_argument(
+        "--rollout_batch", 
+        type=int, 
+        default=0, 
+        help="Number of MCTS leaves evaluated per vectorized rollout batch (0: one rollout at a time)"
+    )
+    parser.add_argument(
+        "--time_budget_ms", "--time-budget-ms", 
+        type=float, 
+        default=None, 
+        help="Anytime MCTS: run simulations until this per-decision time budget (ms) is spent instead of --rollout simulations"
+    )
+    parser.add_argument(
+        "--distance", 
+        type=str, 
+        choices=["manhattan", "walkable"], 
+        default="manhattan", 
+        help="Distance used by the MCTS and Q-learning rewards: manhattan or walkable (shortest path around walls)"
+    )
+    parser.add_argument(
+        "--map", 
+        type=str, 
+        default=None, 
+        help="Map file to play instead of the built-in map: text (one line per row, one character per cell) or .npy, memory-mapped"
+    )
+    parser.add_argument(
+        "--generate", 
+        type=str, 
+        default=None, 
+        help="Play a generated building map of this size (ROWSxCOLS, e.g. 1000x1000) instead of the built-in map"
+    )
+    parser.add_argument(
+        "--map_seed", 
+        type=int, 
+        default=0, 
+        help="Seed of the generated map"
+    )
+    parser.add_argument(
+        "--occupancy", 
+        type=float, 
+        default=0.02, 
+        help="Fraction of the room cells of the generated map occupied by an agent"
+    )
+    parser.add_argument(
+        "--fires", 
+        type=int, 
+        default=1, 
+        help="Number of fire seeds of the generated map"
+    )
+    parser.add_argument(
+        "--exits", 
+        type=int, 
+        default=4, 
+        help="Number of exits (safety cells) of the generated map"
+    )
+    parser.add_argument(
+        "--save_map", 
+        type=str, 
+        default=None, 
+        help="Write the map (text, or .npy by extension) before playing it"
+    )
     parser.add_argument(
         "--iter", 
         type=int, 
         default=10, 
         help="Number of times to run the experiment for averaging performance"
     )
+    parser.add_argument(
+        "--workers", 
+        type=int, 
+        default=1, 
+        help="Number of processes the iterations are spread over (more than one: the games are not rendered)"
+    )
+    parser.add_argument(
+        "--seed", 
+        type=int, 
+        default=None, 
+        help="Seed of the first iteration (iteration i uses seed + i); random if not given"
+    )
+    parser.add_argument(
+        "--render", 
+        type=str, 
+        choices=["none", "terminal", "every", "final", "diff"], 
+        default="terminal", 
+        help="How the map is rendered: none (headless), terminal (every tick), every (every n-th tick), final (last frame only) or diff (only the changed cells are redrawn, for large maps)"
+    )
+    parser.add_argument(
+        "--render_every", 
+        type=int, 
+        default=10, 
+        help="Render every n-th tick when --render every is used"
+    )
+    parser.add_argument(
+        "--viewport", 
+        type=str, 
+        default=None, 
+        help="Part of the map shown by --render diff, as TOP,LEFT,HEIGHT,WIDTH (default: the whole map)"
+    )
+    parser.add_argument(
+        "--scale", 
+        type=int, 
+        default=0, 
+        help="Show every SCALE x SCALE block as one cell with --render diff (0: fit the terminal)"
+    )
+    parser.add_argument(
+        "--fire", 
+        type=str, 
+        choices=["classic", "frontier"], 
+        default="classic", 
+        help="Fire engine: classic (burns through walls) or frontier (wall-aware, spreads from its newest ring only)"
+    )
+    parser.add_argument(
+        "--engine", 
+        type=str, 
+        choices=["objects", "vectorized"], 
+        default="objects", 
+        help="Agent engine: objects (one Python object per agent) or vectorized (NumPy arrays, Random and FlowField only)"
+    )
+    parser.add_argument(
+        "--forecast_pruning", 
+        action="store_true", 
+        help="Let AStar skip the cells the fire forecast reaches before the agent and MCTS count future burns in its rewards"
+    )
+    parser.add_argument(
+        "--capacity", 
+        type=int, 
+        default=0, 
+        help="Maximum number of agents in a cell (0: unlimited); moves into a full cell are rejected and the agent waits, exits are never full"
+    )
+    parser.add_argument(
+        "--decision_workers", 
+        type=int, 
+        default=0, 
+        help="Processes the agent decisions of every tick are spread over (0 or 1: in the game process); objects engine with unlimited capacity only"
+    )
+    parser.add_argument(
+        "--training", 
+        type=str, 
+        choices=["thread", "process", "shared"], 
+        default="thread", 
+        help="Q-learning training: thread (one table per agent in threads), process (one table per agent over a process pool) or shared (one table trained from all start positions, --rollout episodes in total)"
+    )
+    parser.add_argument(
+        "--profile", 
+        type=str, 
+        default=None, 
+        help="Profile every run and write it to this path with the run seed appended: Chrome trace (.json) or JSON lines (.jsonl)"
+    )
+    parser.add_argument(
+        "--replay", 
+        type=str, 
+        default=None, 
+        help="Write a replay log of every run (per-tick deltas as JSON lines, gzip-compressed for .gz) to this path with the run seed appended; play it with python -m src.replay"
+    )
+    parser.add_argument(
+        "--policy_cache", 
+        type=str, 
+        default=None, 
+        help="Directory of the on-disk Q-table cache; training is skipped when the map, fire seeds and hyperparameters are unchanged"
+    )
+    parser.add_argument(
+        "--policy_cache_mb", 
+        type=int, 
+        default=1024, 
+        help="Size of the Q-table cache before the least recently used tables are evicted (MB)"
+    )
 
     return parser.parse_args()
 
 
+def parse_viewport(text):
+    """ (top, left, height, width) of a TOP,LEFT,HEIGHT,WIDTH string, or None """
+    if not text:
+        return None
+    return tuple(int(value) for value in text.split(","))
+
+
+def make_map(args):
+    """ Built-in, loaded or generated map """
+    if args.map:
+        return load_map(args.map)
+    if args.generate:
+        rows, cols = (int(size) for size in args.generate.lower().split("x"))
+        return building_map(rows, cols, seed=args.map_seed, occupancy=args.occupancy, fires=args.fires, exits=args.exits)
+    return DEFAULT_MAP
+
+
 if __name__ == "__main__":
     args = parse_args()
-    res_tick = []
-    res_safe = []
-    objective = []
-    for _ in range(args.iter):
-        tick, safe, num_agents, obj = Game(deepcopy(game_map), args.method, rollout=args.rollout, end_ticks=args.end_ticks).run()
-        res_tick.append(tick)
-        res_safe.append(safe)
-        objective.append(obj)
+    game_map = make_map(args)
+    if args.save_map:
+        save_map(args.save_map, game_map)
+    policy_cache = PolicyCache(args.policy_cache, max_bytes=args.policy_cache_mb * 1024 * 1024) if args.policy_cache else None
+    results = run_experiments(
+        game_map, args.iter, workers=args.workers, seed=args.seed,
+        method=args.method, rollout=args.rollout, end_ticks=args.end_ticks, rollout_batch=args.rollout_batch, distance=args.distance, time_budget_ms=args.time_budget_ms,
+        render=args.render, render_every=args.render_every, render_viewport=parse_viewport(args.viewport), render_scale=args.scale, fire_engine=args.fire, engine=args.engine, capacity=args.capacity, decision_workers=args.decision_workers, forecast_pruning=args.forecast_pruning, training=args.training,
+        policy_cache=policy_cache, profile=args.profile, replay=args.replay
+    )
 
-    print(f"Method: {args.method}")
-    print(f"Average Saved Agent: {round(sum(res_safe)/(num_agents*args.iter), 2)}")
-    print(f"Average Time: {round(sum(res_tick)/args.iter, 2)}")
-    print(f"Objective function: {round(sum(objective) / len(objective))}")
-    print(f"Average objective: {round(sum(objective) / (num_agents*len(objective)))}")
+    for i, (seed, tick, safe, num_agents, obj, game_stats) in enumerate(results):
+        print(f"Run {i} (seed {seed}): Time: {tick}, Saved Agent: {safe}/{num_agents}, Objective function: {obj}")
+        for name, latency in game_stats.get("latency", {}).items():
+            print(f"    {name}: {latency['count']} calls, mean {latency['mean_ms']:.3f} ms, p50 {latency['p50_ms']:.3f} ms, p99 {latency['p99_ms']:.3f} ms, max {latency['max_ms']:.3f} ms")
 
+    stats = summarize(results)
+    print(f"Method: {args.method}")
+    print(f"Average Saved Agent: {round(stats['saved_mean'], 2)} (variance {round(stats['saved_var'], 4)})")
+    print(f"Average Time: {round(stats['time_mean'], 2)} (variance {round(stats['time_var'], 2)})")
+    print(f"Objective function: {round(stats['objective_mean'])} (variance {round(stats['objective_var'], 2)})")
+    print(f"Average objective: {round(stats['objective_per_agent'])}")
+    if stats['decisions']:
+        print(f"Simulations per decision: {round(stats['simulations'] / stats['decisions'], 1)}")
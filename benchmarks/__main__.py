@@ -0,0 +1,89 @@
+from benchmarks.suite import CASES, DEFAULT_OPTIONS, run_suite, save, load, compare
+import argparse
+import sys
+
+
+def parse_size(text):
+    rows, cols = text.lower().split("x")
+    return int(rows), int(cols)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmarks of the simulation hot paths")
+
+    parser.add_argument(
+        "--sizes", 
+        type=str, 
+        default="50x50,200x200", 
+        help="Comma separated sizes (ROWSxCOLS) of the generated maps, run after the built-in 22x19 map"
+    )
+    parser.add_argument(
+        "--agents", 
+        type=str, 
+        default="10,100", 
+        help="Comma separated agent counts of the generated maps"
+    )
+    parser.add_argument(
+        "--cases", 
+        type=str, 
+        default=None, 
+        help=f"Comma separated cases to run (default: all): {', '.join(CASES)}"
+    )
+    parser.add_argument(
+        "--repeat", 
+        type=int, 
+        default=DEFAULT_OPTIONS["repeat"], 
+        help="Timed runs of every case (the median is compared)"
+    )
+    parser.add_argument(
+        "--seed", 
+        type=int, 
+        default=0, 
+        help="Seed of the generated maps and of the runs"
+    )
+    parser.add_argument(
+        "--output", 
+        type=str, 
+        default=None, 
+        help="Write the results as JSON to this file"
+    )
+    parser.add_argument(
+        "--baseline", 
+        type=str, 
+        default=None, 
+        help="JSON results of an earlier run to compare against; exits with status 1 on a regression"
+    )
+    parser.add_argument(
+        "--tolerance", 
+        type=float, 
+        default=0.25, 
+        help="Allowed slowdown of the median time over the baseline before it counts as a regression (0.25: 25%%)"
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    sizes = [parse_size(size) for size in args.sizes.split(",") if size]
+    agent_counts = [int(count) for count in args.agents.split(",") if count]
+    cases = args.cases.split(",") if args.cases else None
+    for name in cases or []:
+        if name not in CASES:
+            sys.exit(f"Unknown case: {name}")
+
+    report = run_suite(sizes, agent_counts, cases, options={"repeat": args.repeat}, seed=args.seed)
+    if args.output:
+        save(report, args.output)
+
+    if args.baseline:
+        baseline = load(args.baseline)
+        regressions = 0
+        print(f"Compared with {args.baseline}:")
+        if baseline["meta"].get("options") != report["meta"]["options"]:
+            print(f"Warning: the baseline was measured with other options {baseline['meta'].get('options')}")
+        for result_id, ratio, regressed in compare(report, baseline, args.tolerance):
+            regressions += regressed
+            print(f"{result_id:<60} " + ("new" if ratio is None else f"{ratio:6.2f}x" + (" REGRESSION" if regressed else "")))
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,70 @@
+import argparse
+import filecmp
+import os
+import random
+import sys
+import tempfile
+import numpy as np
+from src.maps import DEFAULT_MAP, building_map
+from src.game import Game
+
+METHODS = ["AStar", "SpaceTimeAStar", "FlowField"]
+
+
+def run(game_map, method, seed, workers, replay):
+    """ Play one seeded game and return its results """
+    random.seed(seed)
+    np.random.seed(seed)
+    game = Game(game_map, method=method, render='none', replay=replay, decision_workers=workers)
+    return game.run()
+
+
+def check(maps, methods, worker_counts, seed, directory):
+    """ Compare the replay and results of every game in one process and over the worker processes """
+    mismatches = 0
+    for map_name, game_map in maps:
+        for method in methods:
+            serial_replay = os.path.join(directory, f"{map_name}-{method}-serial.jsonl")
+            serial = run(game_map, method, seed, 0, serial_replay)
+            for workers in worker_counts:
+                replay = os.path.join(directory, f"{map_name}-{method}-{workers}.jsonl")
+                result = run(game_map, method, seed, workers, replay)
+                same = result == serial and filecmp.cmp(serial_replay, replay, shallow=False)
+                mismatches += not same
+                print(f"{map_name:<10} {method:<15} {workers} workers: " + ("same" if same else f"DIFFERENT {result} != {serial}"))
+    return mismatches
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check that the decision workers replay the games played in one process")
+
+    parser.add_argument(
+        "--workers",
+        type=str,
+        default="2,4",
+        help="Comma separated numbers of decision workers"
+    )
+    parser.add_argument(
+        "--methods",
+        type=str,
+        default=",".join(METHODS),
+        help="Comma separated deterministic methods to check"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the runs"
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    maps = [("default", DEFAULT_MAP), ("building", building_map(60, 90, seed=1, occupancy=0.04, fires=2))]
+    worker_counts = [int(count) for count in args.workers.split(",") if count]
+    with tempfile.TemporaryDirectory() as directory:
+        mismatches = check(maps, args.methods.split(","), worker_counts, args.seed, directory)
+    if mismatches:
+        sys.exit(1)
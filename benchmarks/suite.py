@@ -0,0 +1,221 @@
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import time
+import numpy as np
+from src.maps import DEFAULT_MAP, random_map, parse_map
+from src.fire import FIRE_ENGINES
+from src.fire_forecast import FireForecast
+from src.distance_field import RewardFields
+from src.agent_base import AgentBase
+from src.agent_astar import AgentAStar
+from src.agent_mcts import AgentMCTS
+from src.agent_qlearning import AgentQLearning
+from src.game import Game, FIRE_TICKS
+
+
+class Scenario:
+    """ One map of the benchmark with its parsed grid and positions """
+    def __init__(self, name, game_map):
+        self.name = name
+        self.game_map = game_map
+        self.grid, self.agent_positions, self.fire_positions, self.safety_positions = parse_map(game_map)
+
+    @property
+    def cells(self):
+        return self.grid.rows * self.grid.cols
+
+    def forecast(self, walls_block=False):
+        return FireForecast(self.grid, self.fire_positions, FIRE_TICKS, walls_block=walls_block)
+
+
+# Every case takes (scenario, options) and returns (setup, timed): timed() is measured after setup() for every repeat
+def fire_expand(engine):
+    def case(scenario, options):
+        state = {}
+        def setup():
+            state['fire'] = FIRE_ENGINES[engine](scenario.grid, scenario.fire_positions)
+        def timed():
+            for _ in range(options['fire_steps']):
+                state['fire'].expand()
+        return setup, timed
+    return case
+
+
+def fire_move_fire(scenario, options):
+    state = {}
+    def setup():
+        state['fire'] = FIRE_ENGINES['classic'](scenario.grid, scenario.fire_positions)
+        state['agents'] = [AgentBase(scenario.grid, pos, scenario.safety_positions) for pos in scenario.agent_positions]
+    def timed():
+        for _ in range(options['fire_steps']):
+            state['agents'], _ = state['fire'].move_fire(state['agents'])
+    return setup, timed
+
+
+def astar_move_agent(scenario, options):
+    forecast = scenario.forecast()
+    fire_positions = set(scenario.fire_positions)
+    state = {}
+    def setup():
+        state['agents'] = [AgentAStar(scenario.grid, pos, scenario.safety_positions, forecast) for pos in scenario.agent_positions]
+    def timed():
+        for agent in state['agents']:
+            agent.move_agent(fire_positions)
+    return setup, timed
+
+
+def mcts_select_action(scenario, options):
+    forecast = scenario.forecast()
+    reward_fields = RewardFields(scenario.grid, scenario.safety_positions, scenario.fire_positions)
+    fire_positions = set(scenario.fire_positions)
+    state = {}
+    def setup():
+        state['agents'] = [
+            AgentMCTS(scenario.grid, pos, scenario.safety_positions, simulations=options['simulations'], fire_forecast=forecast, reward_fields=reward_fields)
+            for pos in scenario.agent_positions[:options['mcts_agents']]
+        ]
+        for agent in state['agents']:
+            agent.fire_positions = fire_positions
+    def timed():
+        for agent in state['agents']:
+            agent.select_action()
+    return setup, timed
+
+
+def qlearning_learn(scenario, options):
+    forecast = scenario.forecast()
+    reward_fields = RewardFields(scenario.grid, scenario.safety_positions, scenario.fire_positions)
+    state = {}
+    def setup():
+        state['agent'] = AgentQLearning(scenario.grid, scenario.agent_positions[0], scenario.safety_positions, fire_forecast=forecast, reward_fields=reward_fields)
+        state['fire'] = FIRE_ENGINES['classic'](scenario.grid, scenario.fire_positions)
+    def timed():
+        state['agent'].learn(state['fire'], 0, FIRE_TICKS, options['episodes'])
+    return setup, timed
+
+
+def game_run(method, engine='objects'):
+    def case(scenario, options):
+        state = {}
+        def setup():
+            state['game'] = Game(scenario.game_map, method=method, rollout=options['simulations'], render='none', engine=engine)
+        def timed():
+            state['game'].run()
+        return setup, timed
+    return case
+
+
+# name: (case, largest map in cells it is run on, None for any size)
+CASES = {
+    "fire.expand[classic]": (fire_expand('classic'), None),
+    "fire.expand[frontier]": (fire_expand('frontier'), None),
+    "fire.move_fire": (fire_move_fire, None),
+    "astar.move_agent": (astar_move_agent, 250_000),
+    "mcts.select_action": (mcts_select_action, 250_000),
+    "qlearning.learn": (qlearning_learn, 250_000),
+    "game.run[Random]": (game_run('Random'), 250_000),
+    "game.run[AStar]": (game_run('AStar'), 10_000),
+    "game.run[FlowField,vectorized]": (game_run('FlowField', 'vectorized'), 1_000_000),
+}
+
+DEFAULT_OPTIONS = {
+    "repeat": 3,
+    "fire_steps": 50, # Spreads per fire case (the fire grows over them)
+    "simulations": 50, # MCTS simulations per decision
+    "mcts_agents": 5, # Agents deciding in the MCTS case
+    "episodes": 20, # Q-learning training episodes
+}
+
+
+def scenarios(sizes, agent_counts, seed=0):
+    """ The built-in map, then a generated map for every size and agent count """
+    yield Scenario("default", DEFAULT_MAP)
+    for rows, cols in sizes:
+        for agents in agent_counts:
+            yield Scenario(f"random{rows}x{cols}", random_map(rows, cols, agents, seed=seed))
+
+
+def run_case(name, scenario, options, seed=0):
+    """ Time the case on the scenario and return its result entry """
+    case, max_cells = CASES[name]
+    entry = {
+        "id": f"{name}/{scenario.name}/{len(scenario.agent_positions)}",
+        "case": name,
+        "map": scenario.name,
+        "rows": scenario.grid.rows,
+        "cols": scenario.grid.cols,
+        "agents": len(scenario.agent_positions),
+    }
+    if max_cells is not None and scenario.cells > max_cells:
+        entry["skipped"] = f"map larger than {max_cells} cells"
+        return entry
+
+    setup, timed = case(scenario, options)
+    times = []
+    for i in range(options["repeat"]):
+        random.seed(seed + i)
+        np.random.seed(seed + i)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull): # Progress prints of the agents
+            setup()
+            start = time.perf_counter()
+            timed()
+            times.append(time.perf_counter() - start)
+
+    entry.update(times=times, min=min(times), median=statistics.median(times), mean=statistics.mean(times))
+    return entry
+
+
+def run_suite(sizes, agent_counts, cases=None, options=None, seed=0, log=print):
+    """ Run the cases on every scenario and return the report (metadata and results) """
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    results = []
+    for scenario in scenarios(sizes, agent_counts, seed):
+        for name in cases or CASES:
+            entry = run_case(name, scenario, options, seed)
+            results.append(entry)
+            if log is not None:
+                log(f"{entry['id']:<60} " + (f"skipped ({entry['skipped']})" if "skipped" in entry else f"{entry['median'] * 1000:10.2f} ms"))
+
+    return {"meta": metadata(options, seed), "results": results}
+
+
+def metadata(options, seed):
+    """ Machine and settings the results were measured with """
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "seed": seed,
+        "options": options,
+    }
+
+
+def save(report, path):
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(report, baseline, tolerance=0.25):
+    """ Ratio of the median time of every result to the baseline one, as (id, ratio, regressed) tuples
+    (ratio None when the baseline has no timing for it) """
+    baseline_medians = {entry["id"]: entry["median"] for entry in baseline["results"] if "median" in entry}
+    comparison = []
+    for entry in report["results"]:
+        if "median" not in entry:
+            continue
+        base = baseline_medians.get(entry["id"])
+        ratio = entry["median"] / base if base else None
+        comparison.append((entry["id"], ratio, ratio is not None and ratio > 1 + tolerance))
+    return comparison
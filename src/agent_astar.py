@@ -1,42 +1,108 @@
 import heapq
-from src.agent_base import AgentBase, WALL
+from src.agent_base import AgentBase
+
+class BlockedPositions:
+    """ A shared set of blocked positions with a few more of one agent, checked without copying the shared set """
+    def __init__(self, shared, extra):
+        self.shared = shared
+        self.extra = extra
+
+    def __contains__(self, position):
+        return position in self.extra or position in self.shared
 
 class AgentAStar(AgentBase):
-    def __init__(self, game_map, agent_position, safety_positions):
-        super().__init__(game_map, agent_position, safety_positions)
+    """ A* to the nearest reachable safety position around the fire and the cells next to it
+
+    Without a PathCache the route is searched again every tick. With one, the agent keeps its route until the fire
+    reaches it (the cache drops it), its next step is full, one of its cells becomes doomed (the tick is computed once
+    when the route is planned), or a blocked move detached it; and a search can finish along the route of another agent
+    to the same goal. The searches then also share the blocked positions the cache keeps up to date with the fire.
+    """
+    def __init__(self, grid, agent_position, safety_positions, fire_forecast=None, occupancy=None, path_cache=None):
+        super().__init__(grid, agent_position, safety_positions, fire_forecast)
+        self.occupancy = occupancy # Optional Occupancy: full neighbouring cells are avoided
+        self.path_cache = path_cache # Optional PathCache shared by the agents
+        self.route_key = path_cache.register() if path_cache is not None else None # Key of the route in the cache
+        self.route = [] # Remaining positions of the kept route, next one last
+        self.route_expiry = float('inf') # Tick at which a remaining cell of the route becomes doomed
+        self.goal = None # Safety position the route leads to
 
     def heuristic(self, a, b):
         return abs(a[0] - b[0]) + abs(a[1] - b[1])
 
     def get_neighbors(self, position, blocked_positions):
-        row, col = position
         neighbors = []
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-        for dr, dc in directions:
-            nr, nc = row + dr, col + dc
-            if 0 <= nr < len(self.game_map) and 0 <= nc < len(self.game_map[0]):
-                if (nr, nc) not in blocked_positions:
-                    neighbors.append((nr, nc))
+        for _, neighbor in self.grid.valid_moves(position):
+            if neighbor not in blocked_positions and not self.is_doomed(neighbor):
+                neighbors.append(neighbor)
         return neighbors
 
+    def is_doomed(self, position):
+        """ Check if the fire reaches the position before the agent possibly can """
+        if self.fire_forecast is None:
+            return False
+        earliest_arrival = self.ticks + self.heuristic(self.agent_position, position)
+        return self.fire_forecast.is_burning(position, earliest_arrival)
+
+    def cached_length(self, position, goal, routes, blocked_positions, lengths):
+        """ Length of the cached route from the position to the goal if this agent can follow all of it, else None
+
+        Every position after the given one is checked like get_neighbors does; the lengths are memoized in lengths.
+        """
+        chain = []
+        seen = set() # Positions of the chain, a route that loops back is broken
+        length = None
+        while True:
+            if position in lengths:
+                length = lengths[position]
+                break
+            if position == goal:
+                length = 0
+                break
+            entry = routes.get(position)
+            if entry is None or position in seen:
+                break
+            chain.append(position)
+            seen.add(position)
+            position = entry[1]
+            if position in blocked_positions or self.is_doomed(position):
+                break
+        for position in reversed(chain):
+            if length is not None:
+                length += 1
+            lengths[position] = length
+        return lengths[chain[0]] if chain else length
+
     def a_star_search(self, start, goal, blocked_positions):
+        # Reaching a cell of a cached route to the goal that this agent can follow adds the complete path through it,
+        # with its exact length: it is only taken once no other path can be shorter
+        routes = self.path_cache.routes_to(goal) if self.path_cache is not None else {}
+        cached_lengths = {}
         open_set = []
-        heapq.heappush(open_set, (0, start))
+        heapq.heappush(open_set, (0, 1, start)) # (f, 0 for a complete cached path else 1, position)
         came_from = {}
         g_score = {start: 0}
         f_score = {start: self.heuristic(start, goal)}
 
         while open_set:
-            current_f, current = heapq.heappop(open_set)
+            current_f, searched, current = heapq.heappop(open_set)
+            if searched:
+                self.nodes_expanded += 1
 
-            if current == goal:
+            if current == goal or not searched:
                 path = []
+                end = current
                 while current in came_from:
                     path.append(current)
                     current = came_from[current]
                 path.append(start)
                 path.reverse()
-                return path
+                return path if searched else path + self.path_cache.follow(goal, end)
+
+            if current in routes:
+                length = self.cached_length(current, goal, routes, blocked_positions, cached_lengths)
+                if length is not None:
+                    heapq.heappush(open_set, (g_score[current] + length, 0, current))
 
             for neighbor in self.get_neighbors(current, blocked_positions):
                 tentative_g = g_score.get(current, float('inf')) + 1
@@ -44,48 +110,178 @@ class AgentAStar(AgentBase):
                     came_from[neighbor] = current
                     g_score[neighbor] = tentative_g
                     f = tentative_g + self.heuristic(neighbor, goal)
-                    heapq.heappush(open_set, (f, neighbor))
+                    heapq.heappush(open_set, (f, 1, neighbor))
                     f_score[neighbor] = f
 
         return None
 
-    def move_agent(self, fire_positions):
-        fire_adjacent = set()
-        for (r, c) in fire_positions:
-            for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                nr, nc = r + dr, c + dc
-                if 0 <= nr < len(self.game_map) and 0 <= nc < len(self.game_map[0]):
-                    fire_adjacent.add((nr, nc))
-
-        blocked = set()
-        for r in range(len(self.game_map)):
-            for c in range(len(self.game_map[0])):
-                if self.game_map[r][c] == WALL:
-                    blocked.add((r, c))
-        blocked.update(fire_positions)
-        blocked.update(fire_adjacent)
+    def route_usable(self):
+        """ Check if the kept route can still be followed this tick """
+        if not self.route or not self.path_cache.has_route(self.route_key):
+            return False
+        next_position = self.route[-1]
+        if self.heuristic(next_position, self.agent_position) != 1:
+            return False
+        if self.occupancy is not None and not self.occupancy.has_room(next_position):
+            return False
+        # The cells farther on are checked by the cache when the fire reaches them
+        return not self.is_doomed(next_position) and self.ticks < self.route_expiry
+
+    def doom_tick(self, route):
+        """ First tick at which a cell of the route (next position last) is doomed while the agent follows it """
+        if self.fire_forecast is None:
+            return float('inf')
+        positions = [self.agent_position] + route[::-1]
+        expiry = float('inf')
+        for j in range(1, len(positions)):
+            position = positions[j]
+            # Along the route the agent is never farther than j - i from the position, so a position the fire reaches
+            # after the agent walks on it is never doomed on the way
+            if not self.fire_forecast.is_burning(position, self.ticks + j):
+                continue
+            for i in range(1, min(j, expiry - self.ticks)):
+                if self.fire_forecast.is_burning(position, self.ticks + i + self.heuristic(positions[i], position)):
+                    expiry = self.ticks + i
+                    break
+        return expiry
+
+    def plan(self, fire_positions):
+        """ Search a path to the nearest reachable safety position (None if there is none) """
+
+        # Walls are already excluded by the grid neighbour table
+        if self.path_cache is not None:
+            blocked = self.path_cache.blocked # The fire and the cells next to it, updated at every spread
+        else:
+            fire_adjacent = set()
+            for (r, c) in fire_positions:
+                for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+                    nr, nc = r + dr, c + dc
+                    if 0 <= nr < self.grid.rows and 0 <= nc < self.grid.cols:
+                        fire_adjacent.add((nr, nc))
+
+            blocked = set(fire_positions)
+            blocked.update(fire_adjacent)
+        if self.occupancy is not None and self.occupancy.capacity > 0:
+            # Route around the congested cells next to the agent (the farther ones will have moved on)
+            full = self.occupancy.full_positions([neighbor for _, neighbor in self.grid.valid_moves(self.agent_position)])
+            if full:
+                blocked = BlockedPositions(blocked, set(full))
 
         sorted_safety = sorted(
             self.safety_positions,
             key=lambda pos: self.heuristic(pos, self.agent_position)
         )
 
-        path = None
         for safety_pos in sorted_safety:
             path = self.a_star_search(self.agent_position, safety_pos, blocked)
             if path:
-                break
+                self.goal = safety_pos
+                return path
+        return None
+
+    def move_agent(self, fire_positions):
+        if self.path_cache is None:
+            path = self.plan(fire_positions)
+            new_position = path[1] if path and len(path) >= 2 else self.agent_position
+        else:
+            if not self.route_usable():
+                path = self.plan(fire_positions)
+                self.route = path[:0:-1] if path and len(path) >= 2 else []
+                self.route_expiry = self.doom_tick(self.route)
+                if self.route:
+                    self.path_cache.store(self.route_key, self.goal, self.route)
+                else:
+                    self.path_cache.drop(self.route_key)
+            new_position = self.agent_position
+            if self.route:
+                new_position = self.route.pop()
+                if not self.route: # Arrived
+                    self.path_cache.drop(self.route_key)
 
-        new_position = self.agent_position
-        if path and len(path) >= 2:
-            new_position = path[1]
+        self.agent_position = new_position
+        self.distance_traveled += 1
+        self.ticks += 1
+
+        if new_position in fire_positions:
+            return 0
+        elif new_position in self.safety_positions:
+            return 2
+        else:
+            return 1
+
+class AgentSpaceTimeAStar(AgentAStar):
+    """ A* over (cell, tick) states checked against the predicted fire arrival ticks
+
+    Fire only grows, so reaching a cell earlier is never worse than reaching it later:
+    waiting never helps and the closed set only has to keep the earliest tick per cell.
+    The planned path stays valid as long as the forecast holds, so it is only replanned when it runs out.
+    """
+    def __init__(self, grid, agent_position, safety_positions, fire_forecast, safety_margin=0, occupancy=None):
+        super().__init__(grid, agent_position, safety_positions, fire_forecast, occupancy)
+        self.safety_margin = safety_margin # Extra ticks required between the agent and the fire
+        self.safety_set = set(safety_positions)
+        self.path = [] # Remaining planned positions, next one last
+
+    def nearest_safety_distance(self, position):
+        return min(self.heuristic(position, safety) for safety in self.safety_positions)
+
+    def is_safe(self, position, tick):
+        """ Check if the agent can stand on the position at the given tick """
+        return not self.fire_forecast.is_burning(position, tick + self.safety_margin)
+
+    def space_time_search(self, start, start_tick):
+        """ Earliest-arrival path from start to any safety position (next position last), or None """
+        counter = 0 # Last tie-break to keep the heap ordering stable
+        open_set = [(self.nearest_safety_distance(start), 0, counter, start)]
+        came_from = {}
+        best_tick = {start: start_tick}
+        closed = set()
+
+        while open_set:
+            _, _, _, current = heapq.heappop(open_set)
+            if current in closed:
+                continue
+            closed.add(current)
+            self.nodes_expanded += 1
+
+            if current in self.safety_set:
+                path = []
+                while current in came_from:
+                    path.append(current)
+                    current = came_from[current]
+                return path
+
+            tick = best_tick[current] + 1
+            for _, neighbor in self.grid.valid_moves(current):
+                if neighbor in closed:
+                    continue
+                if tick >= best_tick.get(neighbor, float('inf')) or not self.is_safe(neighbor, tick):
+                    continue
+                best_tick[neighbor] = tick
+                came_from[neighbor] = current
+                h = self.nearest_safety_distance(neighbor)
+                counter += 1
+                # Ties on f are broken towards the smallest h (deepest node), which keeps the open set small on large grids
+                heapq.heappush(open_set, (tick - start_tick + h, h, counter, neighbor))
+
+        return None
+
+    def move_agent(self, fire_positions):
+        # Replan when the next step burns or no longer follows the agent (its last move was blocked)
+        if not self.path or self.path[-1] in fire_positions or self.heuristic(self.path[-1], self.agent_position) != 1:
+            self.path = self.space_time_search(self.agent_position, self.ticks) or []
+        if not self.path:
+            # No route beats the fire: fall back to the snapshot A*
+            return super().move_agent(fire_positions)
 
+        new_position = self.path.pop()
         self.agent_position = new_position
         self.distance_traveled += 1
+        self.ticks += 1
 
         if new_position in fire_positions:
             return 0
         elif new_position in self.safety_positions:
             return 2
         else:
-            return 1
\ No newline at end of file
+            return 1
@@ -35,12 +35,15 @@ move_dict = {
 
 
 class AgentBase:
-    def __init__(self, game_map, agent_position, safety_positions):
-        self.game_map = game_map
+    def __init__(self, grid, agent_position, safety_positions, fire_forecast=None):
+        self.grid = grid # Grid shared by all agents
         self.agent_position = agent_position
         self.safety_positions = safety_positions
+        self.fire_forecast = fire_forecast # Optional FireForecast shared by all agents
         self.move = None
         self.distance_traveled = 0
+        self.nodes_expanded = 0 # Search nodes expanded so far (planning agents)
+        self.ticks = 0 # Number of ticks the agent has been moving
 
     @property
     def next_agent_position_location(self):
@@ -56,22 +59,7 @@ class AgentBase:
     
     def __get_move_possibilities(self):
         """ Retrieve all possible movement options (only wall is impossible) """
-        possibilities = []
-        agent_column = [l[self.agent_position[1]] for l in self.game_map]
-        agent_line = self.game_map[self.agent_position[0]]
-
-        factory_status = {
-            "up": agent_column[self.agent_position[0] - 1],
-            "down": agent_column[self.agent_position[0] + 1],
-            "left": agent_line[self.agent_position[1] - 1],
-            "right": agent_line[self.agent_position[1] + 1]
-        }
-
-        for possibility, possibility_value in zip(factory_status.keys(), factory_status.values()):
-            if possibility_value not in [WALL]:
-                possibilities.append(possibility)
-
-        return possibilities
+        return [ACTIONS[action] for action, _ in self.grid.valid_moves(self.agent_position)]
     
     def get_move(self):
         """ Randomly move in the move_possibilities """
@@ -88,6 +76,7 @@ class AgentBase:
         new_position = (self.agent_position[0] + move_dict[self.move][0], self.agent_position[1] + move_dict[self.move][1])
         self.agent_position = new_position
         self.distance_traveled += 1
+        self.ticks += 1
 
         # Update the status of agent
         status = 1 # Alive
@@ -1,69 +1,204 @@
 import numpy as np
-import random
 import math
-from collections import defaultdict
-from src.agent_base import WALL, ACTIONS, DIRECTION_MAP
-
-
-class MCTSNode:
-    def __init__(self, state, parent=None):
-        self.state = state  # Agent's current position
-        self.parent = parent  # Parent node in the tree
-        self.children = {}  # Store child nodes (action -> MCTSNode)
-        self.visits = 0  # Number of times this node has been visited
-        self.value = 0  # Cumulative reward
-
-    def best_child(self, exploration_weight=1.0):
-        """ Select the best child based on Upper Confidence Bound """
-        return max(
-            self.children.items(),
-            key=lambda child: child[1].value / (child[1].visits + 1e-6) + exploration_weight * math.sqrt(math.log(self.visits + 1) / (child[1].visits + 1e-6))
-        )[1]
-
-    def is_fully_expanded(self, valid_moves):
-        """ Check if all possible moves have been expanded """
-        return set(self.children.keys()) == {action for action, _ in valid_moves}
-
-    def get_unexpanded_moves(self, valid_moves):
-        """ Return a list of moves that haven't been expanded yet """
-        return [action for action, _ in valid_moves if action not in self.children]
+import random
+import time
+from src.agent_base import ACTIONS, DIRECTION_MAP
+
+NO_CHILD = np.iinfo(np.int32).max # Larger than any node index
+_log_visits = np.zeros(0) # log(n + 1) of the visit counts n, computed with math.log like the scalar UCB formula
+
+
+def log_visits(visits):
+    """ log(visits + 1) of an array of visit counts, read from a table grown by doubling """
+    global _log_visits
+    top = int(visits.max()) if visits.size else 0
+    if top >= len(_log_visits):
+        _log_visits = np.array([math.log(n + 1) for n in range(max(2 * top, 1024))])
+    return _log_visits[visits.astype(np.int64)]
+
+
+class MCTSTree:
+    """ Search tree stored in preallocated arrays, node 0 is the root
+
+    cells:    int32 flat grid index of the agent position of each node
+    parents:  int32 index of the parent node (-1 for the root)
+    children: int32 (capacity, 4) index of the child reached by each action (-1 if not expanded)
+    visits, values: visit count and cumulative reward of each node
+    open_actions: number of valid actions of each node that have no child yet
+    best:     child with the highest UCB score of each node (-1 without children)
+    The arrays grow by doubling, so a search allocates a handful of arrays instead of one object per node.
+    The UCB scores of a node only change when it is on a backpropagated path, so best is refreshed there,
+    for the whole path at once, and selection just follows it.
+    Nodes are numbered in expansion order (also after a reroot), so ties between children go to the one expanded
+    first, like a max over the children in insertion order.
+    """
+    __slots__ = ("grid", "neighbors", "valid_actions", "exploration_weight", "size",
+                 "cells", "parents", "children", "visits", "values", "open_actions", "best")
+
+    def __init__(self, grid, root_position, capacity=128, exploration_weight=1.0):
+        self.grid = grid
+        self.neighbors = grid.neighbors.reshape(-1, len(ACTIONS))
+        self.valid_actions = grid.valid_actions.reshape(-1, len(ACTIONS))
+        self.exploration_weight = exploration_weight
+        self.size = 0
+        self.cells = np.empty(capacity, dtype=np.int32)
+        self.parents = np.empty(capacity, dtype=np.int32)
+        self.children = np.empty((capacity, len(ACTIONS)), dtype=np.int32)
+        self.visits = np.empty(capacity, dtype=np.float64)
+        self.values = np.empty(capacity, dtype=np.float64)
+        self.open_actions = np.empty(capacity, dtype=np.int8)
+        self.best = np.empty(capacity, dtype=np.int32)
+        self.add(root_position[0] * grid.cols + root_position[1], -1)
+
+    def __grow(self):
+        capacity = 2 * len(self.cells)
+        for name in ("cells", "parents", "children", "visits", "values", "open_actions", "best"):
+            array = getattr(self, name)
+            grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            setattr(self, name, grown)
+
+    def add(self, cell, parent, action=None):
+        """ Add a node for the cell under the parent (reached by the action) and return its index """
+        if self.size == len(self.cells):
+            self.__grow()
+        node = self.size
+        self.cells[node] = cell
+        self.parents[node] = parent
+        self.children[node] = -1
+        self.visits[node] = 0
+        self.values[node] = 0
+        self.open_actions[node] = self.valid_actions[cell].sum()
+        self.best[node] = -1
+        if parent >= 0:
+            self.children[parent, action] = node
+            self.open_actions[parent] -= 1
+        self.size += 1
+        return node
+
+    def position(self, node):
+        return divmod(int(self.cells[node]), self.grid.cols)
+
+    def expand(self, node, action):
+        """ Add the child reached by the action from the node """
+        return self.add(self.neighbors[self.cells[node], action], node, action)
+
+    def unexpanded_actions(self, node):
+        """ Valid actions of the node that have no child yet """
+        return np.flatnonzero(self.valid_actions[self.cells[node]] & (self.children[node] < 0))
+
+    @staticmethod
+    def first_best(children, scores):
+        """ Child with the highest score in each row of child slots (-1 if none), the first expanded one on ties """
+        scores = np.where(children >= 0, scores, -np.inf) # A row without children keeps all its -1 slots
+        return np.where(scores == scores.max(axis=-1, keepdims=True), children, NO_CHILD).min(axis=-1)
+
+    def best_action(self, node=0):
+        """ Action leading to the most visited child """
+        children = self.children[node]
+        best = self.first_best(children, self.visits[np.maximum(children, 0)])
+        return int(np.flatnonzero(children == best)[0])
+
+    def backpropagate(self, path, reward, visits=1):
+        """ Add the visits and the reward to every node of the root-to-leaf path, then refresh its best children """
+        path = np.asarray(path)
+        self.visits[path] += visits
+        self.values[path] += reward
+        self.refresh(path[:-1])
+
+    def backpropagate_batch(self, paths, rewards):
+        """ Add the reward of each path to its nodes (visits already counted), then refresh all the inner nodes once """
+        nodes = np.concatenate(paths)
+        np.add.at(self.values, nodes, np.repeat(rewards, [len(path) for path in paths]))
+        self.refresh(np.unique(np.concatenate([path[:-1] for path in paths])))
+
+    def refresh(self, nodes):
+        """ Recompute the Upper Confidence Bound of the 4 child slots of the nodes at once and keep the best child """
+        children = self.children[nodes]
+        slots = np.maximum(children, 0) # Unexpanded slots read the root and are masked below
+        child_visits = self.visits[slots]
+        child_visits += 1e-6
+        ucb = log_visits(self.visits[nodes])[:, None] / child_visits
+        np.sqrt(ucb, out=ucb)
+        ucb *= self.exploration_weight
+        ucb += self.values[slots] / child_visits
+        self.best[nodes] = self.first_best(children, ucb)
+
+    def subtree(self, node):
+        """ Indices of the nodes of the subtree under the node, in breadth-first order """
+        levels = [np.array([node], dtype=np.int32)]
+        while levels[-1].size:
+            children = self.children[levels[-1]].ravel()
+            levels.append(children[children >= 0])
+        return np.concatenate(levels)
+
+    def reroot(self, node):
+        """ Keep only the subtree under the node (which becomes the root), compacted so the rest is freed """
+        nodes = np.sort(self.subtree(node)) # Keeps the expansion order, the node comes first as it is the oldest
+        remap = np.full(self.size + 1, -1, dtype=np.int32) # Last slot maps the -1 links to -1
+        remap[nodes] = np.arange(len(nodes), dtype=np.int32)
+        self.cells = self.cells[nodes]
+        self.parents = remap[self.parents[nodes]]
+        self.parents[0] = -1
+        self.children = remap[self.children[nodes]]
+        self.visits = self.visits[nodes]
+        self.values = self.values[nodes]
+        self.open_actions = self.open_actions[nodes]
+        self.best = remap[self.best[nodes]]
+        self.size = len(nodes)
 
 class AgentMCTS:
-    def __init__(self, game_map, agent_position, safety_positions, simulations=100, end_ticks=10):
-        self.game_map = game_map
+    def __init__(self, grid, agent_position, safety_positions, simulations=100, end_ticks=10, fire_forecast=None, reuse_tree=True, rollout_engine=None, batch_size=32, reward_fields=None, time_budget_ms=None):
+        self.grid = grid # Grid shared by all agents
         self.agent_position = agent_position
         self.safety_positions = safety_positions
         self.fire_positions = None
+        self.fire_forecast = fire_forecast # Optional FireForecast shared by all agents
         self.simulations = simulations
         self.end_ticks = end_ticks
         self.distance_traveled = 0
+        self.ticks = 0 # Number of ticks the agent has been moving
+        self.reuse_tree = reuse_tree
+        self.reward_fields = reward_fields # Optional RewardFields shared by all agents and kept up to date by the game
+        self.time_budget_ms = time_budget_ms # Per-decision time budget of the anytime mode (None: fixed simulations)
+        self.last_simulations = 0 # Simulations completed for the last decision
+        self.total_simulations = 0
+        self.nodes_expanded = 0 # Tree nodes added over all the decisions
+        self.rollout_engine = rollout_engine # Optional BatchRollout shared by all agents
+        self.batch_size = batch_size # Leaves evaluated per vectorized rollout
+        self.root = None # MCTSTree of the subtree under the last action taken, reused as the next root
+        self.root_fire_size = None # Fire size the kept subtree was last checked against
 
     def get_valid_moves(self, position):
-        """ Get all possible moves from the current position """
-        row, col = position
-        moves = []
-
-        for action, (dx, dy) in DIRECTION_MAP.items():
-            new_row, new_col = row + dx, col + dy
-            if 0 <= new_row < len(self.game_map) and 0 <= new_col < len(self.game_map[0]):
-                if self.game_map[new_row][new_col] not in [WALL]:  
-                    moves.append((list(ACTIONS.keys())[list(ACTIONS.values()).index(action)], (new_row, new_col)))
-
-        return moves
+        """ Get all possible (action, new position) moves from the current position """
+        return self.grid.valid_moves(position)
 
     def get_distance(self, pos1, pos2):
         """ Compute Manhattan distance between two positions """
         return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
 
-    def compute_reward(self, position):
-        """ Compute reward based on proximity to safety and fire """
-        # Distance to nearest safety spot
-        safety_distances = [self.get_distance(position, safe) for safe in self.safety_positions]
-        nearest_safety_distance = min(safety_distances) if safety_distances else float('inf')
+    def is_burning(self, position, tick=None):
+        """ Check if the position is on fire now, or at the given future tick when a forecast is available """
+        if position in self.fire_positions:
+            return True
+        if tick is not None and self.fire_forecast is not None:
+            return self.fire_forecast.is_burning(position, tick)
+        return False
 
-        # Distance to nearest fire
-        fire_distances = [self.get_distance(position, fire) for fire in self.fire_positions]
-        nearest_fire_distance = min(fire_distances) if fire_distances else float('inf')
+    def compute_reward(self, position, tick=None):
+        """ Compute reward based on proximity to safety and fire """
+        if self.reward_fields is not None:
+            # Two lookups in the shared distance fields
+            nearest_safety_distance = self.reward_fields.safety_distance(position)
+            nearest_fire_distance = self.reward_fields.fire_distance(position)
+        else:
+            # Distance to nearest safety spot
+            safety_distances = [self.get_distance(position, safe) for safe in self.safety_positions]
+            nearest_safety_distance = min(safety_distances) if safety_distances else float('inf')
+
+            # Distance to nearest fire
+            fire_distances = [self.get_distance(position, fire) for fire in self.fire_positions]
+            nearest_fire_distance = min(fire_distances) if fire_distances else float('inf')
 
         # Reward formula
         reward = 10 - nearest_safety_distance  # Closer to safety = more reward
@@ -72,22 +207,22 @@ class AgentMCTS:
         # Special cases
         if position in self.safety_positions:
             reward += 100  # Reached safety
-        elif position in self.fire_positions:
+        elif self.is_burning(position, tick):
             reward -= 100 # Got burned
 
         return reward
 
-    def simulate(self, position, depth):
-        """ Perform a random rollout (simulation) from the given position """
+    def simulate(self, position, depth, start_tick=0):
+        """ Perform a random rollout (simulation) from the given position reached at start_tick """
         total_reward = 0
-        for _ in range(depth):  # Simulate up to 10 steps ahead
+        for step in range(depth):  # Simulate up to 10 steps ahead
             valid_moves = self.get_valid_moves(position)
             if not valid_moves:
                 return -10  # Negative reward for being stuck
 
             _, position = random.choice(valid_moves)  # Take a random action
 
-            reward = self.compute_reward(position)
+            reward = self.compute_reward(position, start_tick + step + 1)
             if reward >= 100 or reward <= -100:
                 return reward * depth  # End simulation if safety or fire is reached
             
@@ -96,46 +231,103 @@ class AgentMCTS:
         return total_reward  # Small penalty for each move to encourage efficiency
 
 
-    def backpropagate(self, node, reward):
-        """ Backpropagate the result of a simulation up the tree. """
-        while node is not None:
-            node.visits += 1
-            node.value += reward
-            node = node.parent  # Move up the tree
+    def subtree_burning(self, tree):
+        """ Check if the fire has spread into any cell of the tree """
+        cells = np.unique(tree.cells[tree.subtree(0)])
+        return any(divmod(int(cell), self.grid.cols) in self.fire_positions for cell in cells)
+
+    def reusable_root(self):
+        """ Return the tree kept from the previous decision, or None if it is missing or its stats are invalid """
+        tree = self.root
+        if tree is None or tree.position(0) != tuple(self.agent_position):
+            return None
+        # The fire only grows, so the tree is only checked again when it has spread
+        if self.root_fire_size != len(self.fire_positions):
+            if self.subtree_burning(tree):
+                return None
+            self.root_fire_size = len(self.fire_positions)
+        return tree
+
+    def select_leaf(self, tree):
+        """ Selection and expansion: return the root-to-leaf path of node indices with the leaf state and tick """
+        node = 0
+        path = [node]
+        tick = self.ticks
+
+        # Selection: Follow the best UCT children until reaching an expandable node
+        while tree.open_actions[node] == 0 and tree.best[node] >= 0:
+            node = int(tree.best[node])
+            path.append(node)
+            tick += 1
+
+        # Expansion: Add a new child node for an unvisited action
+        if tree.open_actions[node]:
+            node = tree.expand(node, int(random.choice(tree.unexpanded_actions(node))))
+            self.nodes_expanded += 1
+            path.append(node)
+            tick += 1
+
+        return path, tree.position(node), tick
+
+    def run_batches(self, tree, simulations, deadline=None):
+        """ Select leaves in batches and evaluate each batch with one vectorized rollout, return the number of simulations run """
+        remaining = simulations
+        done = 0
+        while remaining > 0 and (deadline is None or done == 0 or time.perf_counter() < deadline):
+            batch = []
+            for _ in range(min(self.batch_size, remaining)):
+                path, state, tick = self.select_leaf(tree)
+                # Count the visit now so the next selections of the batch spread over the tree
+                tree.backpropagate(path, 0)
+                batch.append((path, state, tick))
+
+            rewards = self.rollout_engine.simulate(
+                [state for _, state, _ in batch], self.end_ticks, [tick for _, _, tick in batch]
+            )
+            tree.backpropagate_batch([path for path, _, _ in batch], rewards)
+            remaining -= len(batch)
+            done += len(batch)
+
+        return done
 
     def select_action(self):
         """ Perform MCTS to choose the best move for Agent. """
-        root = MCTSNode(tuple(self.agent_position))
-
-        for _ in range(self.simulations):  # Run multiple simulations
-            node = root
-            state = tuple(self.agent_position)
-
-            # Selection: Traverse the tree using UCT until reaching an expandable node
-            while node.is_fully_expanded(self.get_valid_moves(state)) and node.children:
-                node = node.best_child()
-                state = node.state
-
-            # Expansion: Add a new child node for an unvisited action
-            valid_moves = self.get_valid_moves(state)
-            unexpanded_moves = node.get_unexpanded_moves(valid_moves)
-
-            if unexpanded_moves:
-                action = random.choice(unexpanded_moves)
-                next_position = dict(valid_moves)[action]
-                new_node = MCTSNode(next_position, parent=node)
-                node.children[action] = new_node
-                node = new_node
-                state = next_position
-
-            # Simulation: Perform a rollout from the new state
-            reward = self.simulate(state, self.end_ticks)
-
-            # Backpropagation: Update values in the tree
-            self.backpropagate(node, reward)
+        tree = self.reusable_root() if self.reuse_tree else None
+        if tree is None:
+            tree = MCTSTree(self.grid, tuple(self.agent_position), capacity=self.simulations + 1)
+            self.root_fire_size = len(self.fire_positions)
+
+        # Anytime mode: run simulations until the deadline (at least one) instead of a fixed number
+        if self.time_budget_ms is not None:
+            deadline = time.perf_counter() + self.time_budget_ms / 1000
+            simulations = float('inf')
+        else:
+            deadline = None
+            simulations = self.simulations
+
+        if self.rollout_engine is None:
+            done = 0
+            while done < simulations and (deadline is None or done == 0 or time.perf_counter() < deadline):  # Run multiple simulations
+                path, state, tick = self.select_leaf(tree)
+
+                # Simulation: Perform a rollout from the new state
+                reward = self.simulate(state, self.end_ticks, tick)
+
+                # Backpropagation: Update values in the tree
+                tree.backpropagate(path, reward)
+                done += 1
+        else:
+            done = self.run_batches(tree, simulations, deadline)
+        self.last_simulations = done
+        self.total_simulations += done
 
         # Choose the best move from the root
-        best_action = max(root.children.items(), key=lambda child: child[1].visits)[0]
+        best_action = tree.best_action()
+
+        # Keep only the subtree of the action taken, compacted so the siblings are freed
+        if self.reuse_tree:
+            tree.reroot(int(tree.children[0, best_action]))
+            self.root = tree
         return best_action
 
     def move_agent(self, fire_positions):
@@ -145,6 +337,7 @@ class AgentMCTS:
         new_position = (self.agent_position[0] + DIRECTION_MAP[ACTIONS[action]][0], self.agent_position[1] + DIRECTION_MAP[ACTIONS[action]][1])
         self.agent_position = new_position
         self.distance_traveled += 1
+        self.ticks += 1
        
         status = 1 # Alive
         if self.agent_position in self.fire_positions:
@@ -1,51 +1,49 @@
 import numpy as np
 import random
 import math
-from collections import defaultdict
-from src.agent_base import WALL, ACTIONS, DIRECTION_MAP
+from src.agent_base import ACTIONS, DIRECTION_MAP
 from src.fire import Fire
-import copy
 
 
 class AgentQLearning:
-    def __init__(self, game_map, agent_position, safety_positions, learning_rate=0.1, discount_factor=0.9, epsilon=0.2):
-        self.game_map = game_map
+    def __init__(self, grid, agent_position, safety_positions, learning_rate=0.1, discount_factor=0.9, epsilon=0.2, fire_forecast=None, reward_fields=None):
+        self.grid = grid # Grid shared by all agents
         self.agent_position = agent_position
         self.safety_positions = set(safety_positions)
         self.fire_positions = set()
+        self.fire_forecast = fire_forecast # Optional FireForecast shared by all agents
+        self.reward_fields = reward_fields # Optional RewardFields shared by all agents (at the initial fire during training)
         
-        # Q-table: State (position) x Action
-        self.q_table = defaultdict(lambda: np.zeros(len(ACTIONS)))
+        # Q-table: dense (rows, cols, actions) tensor, invalid actions are masked with the grid action penalty
+        self.q_table = np.zeros((grid.rows, grid.cols, len(ACTIONS)), dtype=np.float32)
+        self.action_penalty = grid.action_penalty
+        self.has_valid_action = grid.has_valid_action
 
         self.learning_rate = learning_rate
         self.discount_factor = discount_factor
         self.epsilon = epsilon
         self.distance_traveled = 0
+        self.ticks = 0 # Number of ticks the agent has been moving
 
     def get_valid_actions(self, position):
         """Returns list of valid action indices from current position."""
-        row, col = position
-        valid_actions = []
-
-        for action_idx, action in ACTIONS.items():
-            dx, dy = DIRECTION_MAP[action]
-            new_row, new_col = row + dx, col + dy
-            if 0 <= new_row < len(self.game_map) and 0 <= new_col < len(self.game_map[0]):
-                if self.game_map[new_row][new_col] != WALL:
-                    valid_actions.append(action_idx)
-        return valid_actions
+        return self.grid.valid_action_ids(position)
 
     def get_distance(self, pos1, pos2):
         """Compute Manhattan distance"""
         return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
 
-    def compute_reward(self, position, safety_positions, fire_positions):
-        """Reward based on proximity to safety/fire"""
-        if position in self.safety_positions:
+    def compute_reward(self, position, safety_positions, fire_positions, fire_distances=None):
+        """Reward based on proximity to safety/fire (two field lookups when the fire distance array is given)"""
+        if position in safety_positions:
             return 100  # High reward for reaching safety
-        if position in self.fire_positions:
+        if position in fire_positions:
             return -100  # Heavy penalty for fire
 
+        if fire_distances is not None:
+            nearest_fire_distance = float(fire_distances[position[0] * self.grid.cols + position[1]])
+            return 10 - self.reward_fields.safety_distance(position) + (nearest_fire_distance - 5)
+
         safety_distances = [self.get_distance(position, safe) for safe in safety_positions]
         fire_distances = [self.get_distance(position, fire) for fire in fire_positions]
 
@@ -54,24 +52,39 @@ class AgentQLearning:
 
         return 10 - nearest_safety_distance + (nearest_fire_distance - 5)
 
+    def max_q(self, state):
+        """Largest Q-value over the valid actions of the state (0 if there is none)."""
+        if not self.has_valid_action[state]:
+            return 0
+        return float((self.q_table[state] + self.action_penalty[state]).max())
+
     def choose_action(self, state, train=True):
         """Epsilon-greedy action selection."""
-        valid_actions = self.get_valid_actions(state)
-        if not valid_actions:
+        if not self.has_valid_action[state]:
             return None  # No valid moves
 
         if train and random.random() < self.epsilon:
-            return random.choice(valid_actions)  # Explore
+            return random.choice(self.get_valid_actions(state))  # Explore
         else:
-            q_values = self.q_table[state]
-            return max(valid_actions, key=lambda a: q_values[a])  # Exploit best action
+            return int((self.q_table[state] + self.action_penalty[state]).argmax())  # Exploit best action
 
-    def learn(self, fire, agent_id, fire_ticks, episodes=200, max_steps_per_episode=100):
-        """Train agent via Q-learning."""
+    def learn(self, fire, agent_id, fire_ticks, episodes=200, max_steps_per_episode=100, start_positions=None):
+        """Train agent via Q-learning (from random start_positions if given, for a shared table)."""
         print(f'Agent {agent_id} start learning! Learn {episodes} episodes')
+        start_fire = fire.snapshot()
+        # Without a forecast, a private rewindable copy of the fire distance field follows the episode fire
+        fire_field = None
+        if self.reward_fields is not None and self.fire_forecast is None:
+            fire_field = self.reward_fields.fire.fork()
+        fire_distances = None
         for episode in range(episodes):
-            state = tuple(self.agent_position)  # Start at initial position
-            fire_cpy = copy.deepcopy(fire)
+            if start_positions:
+                state = tuple(random.choice(start_positions))
+            else:
+                state = tuple(self.agent_position)  # Start at initial position
+            fire.restore(start_fire) # Every episode starts from the initial fire
+            if fire_field is not None:
+                fire_field.restore(0)
             for i in range(max_steps_per_episode):
                 action = self.choose_action(state)
                 if action is None:
@@ -80,26 +93,37 @@ class AgentQLearning:
                 dx, dy = DIRECTION_MAP[ACTIONS[action]]
                 next_state = (state[0] + dx, state[1] + dy)
 
-                reward = self.compute_reward(next_state, self.safety_positions, fire_cpy.fire_positions)
-                valid_actions = self.get_valid_actions(next_state)
-                if not valid_actions:
-                    max_future_q = 0
+                # Fire the agent faces at the end of this step
+                if self.fire_forecast is not None:
+                    fire_positions = self.fire_forecast.fire_positions_at(i + 1)
+                    if self.reward_fields is not None:
+                        level = min((i + 1) // fire_ticks, len(self.fire_forecast.rings) - 1)
+                        fire_distances = self.reward_fields.fire_distances_at(level, self.fire_forecast.rings)
                 else:
-                    max_future_q = max(self.q_table[next_state][a] for a in valid_actions) 
+                    if (i + 1) % fire_ticks == 0:
+                        new_fire_positions = fire.expand()
+                        if fire_field is not None:
+                            fire_field.ignite(new_fire_positions)
+                    fire_positions = fire.fire_positions
+                    if fire_field is not None:
+                        fire_distances = fire_field.distances
+
+                reward = self.compute_reward(next_state, self.safety_positions, fire_positions, fire_distances)
+                max_future_q = self.max_q(next_state)
 
                 # Temporal Difference update (Q-learning update)
-                self.q_table[state][action] += self.learning_rate * (
-                    reward + self.discount_factor * max_future_q - self.q_table[state][action]
+                index = (state[0], state[1], action)
+                self.q_table[index] += self.learning_rate * (
+                    reward + self.discount_factor * max_future_q - self.q_table[index]
                 )
 
                 state = next_state
-                if i % fire_ticks == 0:
-                    fire.expand()
-
-                if state in self.fire_positions or state in self.safety_positions:
+                if state in fire_positions or state in self.safety_positions:
                     break  # Stop episode if agent reaches fire or safety
-        
+
+        fire.restore(start_fire)
         print(f'Agent {agent_id} Done Learning!')
+
     def move_agent(self, fire_positions):
         """Move agent using the trained Q-table."""
         self.fire_positions = set(fire_positions)
@@ -113,9 +137,32 @@ class AgentQLearning:
         new_position = (self.agent_position[0] + dx, self.agent_position[1] + dy)
         self.agent_position = new_position
         self.distance_traveled += 1
+        self.ticks += 1
 
         if new_position in self.fire_positions:
             return 0  # Dead
         elif new_position in self.safety_positions:
             return 2  # Safe
         return 1  # Alive
+
+
+# State shared by the training processes, set once per worker
+training_context = {}
+
+
+def init_training_worker(grid, safety_positions, fire_forecast, fire, reward_fields=None):
+    """ Store the map, goals, fire and reward fields in the worker so they are not pickled for every agent """
+    training_context.update(grid=grid, safety_positions=safety_positions, fire_forecast=fire_forecast, fire=fire, reward_fields=reward_fields)
+
+
+def train_q_table(agent_position, agent_id, fire_ticks, episodes, seed, learning_rate=0.1, discount_factor=0.9, epsilon=0.2):
+    """ Train one agent in a worker process and return its compact Q-array """
+    random.seed(seed)
+    agent = AgentQLearning(
+        training_context["grid"], agent_position, training_context["safety_positions"],
+        learning_rate=learning_rate, discount_factor=discount_factor, epsilon=epsilon,
+        fire_forecast=training_context["fire_forecast"], reward_fields=training_context["reward_fields"]
+    )
+    agent.learn(training_context["fire"], agent_id, fire_ticks, episodes) # The fire is rewound after training
+
+    return agent.q_table
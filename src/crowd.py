@@ -0,0 +1,120 @@
+import numpy as np
+from src.flow_field import UNREACHABLE
+
+"""
+Status
+0: dead
+1: alive
+2: in safe zone
+"""
+DEAD, ALIVE, SAFE = 0, 1, 2
+
+CROWD_POLICIES = ["Random", "FlowField"]
+
+
+class Crowd:
+    """ Struct-of-arrays agent engine: every agent is an entry of the position, status and distance arrays
+
+    One vectorized step moves all alive agents with the Random policy or by following a
+    precomputed FlowField, and resolves deaths and rescues with boolean masks. With an Occupancy, the moves
+    into full cells are rejected in bulk and its counts follow the alive agents.
+    """
+    def __init__(self, grid, agent_positions, safety_positions, fire_positions, policy="Random", flow_field=None, occupancy=None):
+        if policy not in CROWD_POLICIES:
+            raise ValueError(f"The vectorized engine only supports the {', '.join(CROWD_POLICIES)} policies, not {policy}")
+        if policy == "FlowField" and flow_field is None:
+            raise ValueError("The FlowField policy needs a flow field")
+
+        self.grid = grid
+        self.policy = policy
+        self.flow_field = flow_field
+        self.neighbors = grid.neighbors.reshape(-1, grid.neighbors.shape[-1]) # (cells, 4) flat neighbour table
+
+        self.positions = np.array([r * grid.cols + c for r, c in agent_positions], dtype=np.int64)
+        self.status = np.full(len(self.positions), ALIVE, dtype=np.int8)
+        self.distances = np.zeros(len(self.positions), dtype=np.int32)
+
+        self.safety_mask = np.zeros(grid.rows * grid.cols, dtype=bool)
+        self.safety_mask[[r * grid.cols + c for r, c in safety_positions]] = True
+        self.burning = np.zeros(grid.rows * grid.cols, dtype=bool)
+        self.burning[[r * grid.cols + c for r, c in fire_positions]] = True
+
+        self.occupancy = occupancy # Optional per-cell counts and capacity
+        if occupancy is not None:
+            occupancy.add_cells(self.positions)
+
+    @property
+    def size(self):
+        return len(self.positions)
+
+    def alive_count(self):
+        return int(np.count_nonzero(self.status == ALIVE))
+
+    def alive_positions(self):
+        """ List of the (row, col) positions of the alive agents """
+        rows, cols = np.divmod(self.positions[self.status == ALIVE], self.grid.cols)
+        return list(zip(rows.tolist(), cols.tolist()))
+
+    def __random_moves(self, neighbors):
+        """ Pick one valid neighbour uniformly at random for every agent (stay if there is none) """
+        scores = np.random.random(neighbors.shape)
+        scores[neighbors < 0] = -1
+        choice = np.argmax(scores, axis=1)
+        moves = neighbors[np.arange(len(neighbors)), choice]
+        return moves
+
+    def __field_moves(self, neighbors, fire_positions):
+        """ Step every agent to its neighbour closest to a safety position (stay if none can reach one) """
+        self.flow_field.update(fire_positions)
+        distances = self.flow_field.distances.ravel()[neighbors].astype(np.int64)
+        distances[(neighbors < 0) | (distances == UNREACHABLE)] = np.iinfo(np.int64).max
+        choice = np.argmin(distances, axis=1)
+        moves = neighbors[np.arange(len(neighbors)), choice]
+        moves[distances[np.arange(len(neighbors)), choice] == np.iinfo(np.int64).max] = -1
+        return moves
+
+    def step(self, fire_positions):
+        """ Move all alive agents once and return the number of (saved, dead) agents and the saved agents' distance """
+        alive = np.flatnonzero(self.status == ALIVE)
+        if alive.size == 0:
+            return 0, 0, 0
+
+        positions = self.positions[alive]
+        neighbors = self.neighbors[positions]
+        if self.policy == "Random":
+            moves = self.__random_moves(neighbors)
+        else:
+            moves = self.__field_moves(neighbors, fire_positions)
+        moves = np.where(moves >= 0, moves, positions)
+        if self.occupancy is not None:
+            moves = self.occupancy.resolve(positions, moves)
+        positions = moves
+
+        self.positions[alive] = positions
+        self.distances[alive] += 1
+
+        # Update the status of the agents
+        dead = self.burning[positions]
+        safe = self.safety_mask[positions] & ~dead
+        self.status[alive[dead]] = DEAD
+        self.status[alive[safe]] = SAFE
+        if self.occupancy is not None:
+            self.occupancy.remove_cells(positions[dead | safe])
+
+        return int(np.count_nonzero(safe)), int(np.count_nonzero(dead)), int(self.distances[alive[safe]].sum())
+
+    def ignite(self, new_fire_positions):
+        """ Mark the newly ignited positions and return the number of alive agents they kill """
+        if new_fire_positions:
+            cells = [r * self.grid.cols + c for r, c in new_fire_positions]
+            self.burning[cells] = True
+            if self.occupancy is not None and not self.occupancy.counts[cells].any():
+                return 0 # Nobody stands in the ignited cells
+
+        alive = np.flatnonzero(self.status == ALIVE)
+        dead = alive[self.burning[self.positions[alive]]]
+        self.status[dead] = DEAD
+        if self.occupancy is not None:
+            self.occupancy.remove_cells(self.positions[dead])
+
+        return len(dead)
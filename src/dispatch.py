@@ -0,0 +1,233 @@
+import multiprocessing
+import random
+from multiprocessing import shared_memory
+import numpy as np
+
+_attached = [] # Shared memory blocks mapped by this process, kept open while their arrays are in use
+
+
+def attach_shared(name, shape, dtype):
+    """ Array backed by an existing shared memory block (the block stays mapped for the life of the process) """
+    block = shared_memory.SharedMemory(name=name)
+    _attached.append(block)
+    return np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+class SharedArrayRef:
+    """ Picklable handle of an array in shared memory: it unpickles as the array itself, mapped and not copied """
+    def __init__(self, name, shape, dtype):
+        self.name, self.shape, self.dtype = name, shape, dtype
+
+    def __reduce__(self):
+        return attach_shared, (self.name, self.shape, self.dtype)
+
+
+class SharedArrays:
+    """ Shared memory blocks created by the game for its decision workers, removed by close() """
+    def __init__(self):
+        self.blocks = {} # Block name -> SharedMemory
+
+    def put(self, array):
+        """ Copy the array to a new shared memory block and return its handle """
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        self.blocks[block.name] = block
+        return SharedArrayRef(block.name, array.shape, array.dtype.str)
+
+    def view(self, ref):
+        """ Writable array of a block of this owner (to be released before close) """
+        return np.ndarray(ref.shape, dtype=ref.dtype, buffer=self.blocks[ref.name].buf)
+
+    def share(self, obj, names):
+        """ Place the named array attributes of obj in shared memory, so pickling obj only sends their handles """
+        obj.shared = {name: self.put(getattr(obj, name)) for name in names}
+
+    def close(self):
+        """ Remove the blocks (safe to call more than once) """
+        for block in self.blocks.values():
+            try:
+                block.close()
+            except BufferError: # An array still maps the block, it is unmapped when that array is released
+                pass
+            block.unlink()
+        self.blocks = {}
+
+
+class SharedFire:
+    """ Burning cells in ignition order (flat indices) and their count, written by the game and read by the workers """
+    def __init__(self, cells, count, refs=None):
+        self.cells = cells
+        self.count = count
+        self.refs = refs # Handles of the two arrays, what is pickled
+
+    def __reduce__(self):
+        return SharedFire, (*self.refs, self.refs)
+
+
+def decision_worker(connection):
+    """ Serve the decisions of one shard of agents until the game closes the connection """
+    agents, indices, fire, fire_listeners, path_cache, seed = connection.recv()
+    cols = agents[0].grid.cols if agents else 1
+    known = int(fire.count[0])
+    rows, columns = np.divmod(fire.cells[:known], cols)
+    fire_positions = set(zip(rows.tolist(), columns.tolist()))
+    alive = list(zip(indices, agents))
+
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        tick, route_changes, burned = message
+        if path_cache is not None: # Routes of every shard planned during the last tick, committed before the spread
+            path_cache.commit(route_changes)
+
+        # Catch up with the spread since the last tick: the game tells which agents it burned
+        count = int(fire.count[0])
+        if count > known:
+            rows, columns = np.divmod(fire.cells[known:count], cols)
+            ignited = set(zip(rows.tolist(), columns.tolist()))
+            fire_positions.update(ignited)
+            for listener in fire_listeners: # The worker's copies of the fire distance field and path cache
+                listener.ignite(ignited)
+            known = count
+        if burned:
+            burned = set(burned)
+            alive = [(index, agent) for index, agent in alive if index not in burned]
+
+        results = []
+        still_alive = []
+        for index, agent in alive:
+            # One random stream per agent and tick, so the results do not depend on the number of workers
+            random.seed(seed + index * 1_000_003 + tick)
+            np.random.seed((seed + index * 1_000_003 + tick) % 2**32)
+            expanded = getattr(agent, 'nodes_expanded', 0)
+            status = agent.move_agent(fire_positions)
+            results.append((
+                index, status, agent.agent_position, agent.distance_traveled, agent.ticks,
+                getattr(agent, 'nodes_expanded', 0) - expanded, getattr(agent, 'last_simulations', 0),
+            ))
+            if status == 1:
+                still_alive.append((index, agent))
+        alive = still_alive
+        connection.send((results, path_cache.take_pending() if path_cache is not None else []))
+
+    connection.close()
+
+
+class DecisionDispatcher:
+    """ Persistent worker processes that run the move_agent decisions of one tick in parallel
+
+    Within a tick every decision only depends on the map and the fire, so each worker owns a fixed shard of the agents
+    (round robin) for the whole game. The grid and the fire forecast are placed in shared memory once and the agents
+    are sent once; the game then publishes the newly ignited cells in a shared array and every tick only sends the tick
+    number (with the agents the fire killed since the last one) and gets back the new position, status and counters of
+    the agents. The game applies the results in agent order, like the serial loop, and the workers drop the agents
+    that were saved or died, so their copies follow the game. The routes a shard stores in its copy of the PathCache are gathered, put back in agent
+    order and sent to every worker with the next tick, so all the shards plan with the same committed routes as the
+    serial loop. Deterministic planners give the same results (benchmarks/dispatch_check.py compares the replays). The
+    random ones (Random, MCTS) are seeded per agent and tick instead of sharing the game's random stream: a run is
+    reproducible whatever the number of workers but differs from the run in one process, and the game warns about it.
+    """
+    def __init__(self, agents, grid, fire_positions, workers, shared_objects=(), fire_listeners=(), path_cache=None):
+        self.cols = grid.cols
+        self.agents = list(agents) # The game's copies of the agents, updated from the results
+        self.path_cache = path_cache # The game's PathCache, its copies in the workers get the changes of every shard
+        self.route_changes = [] # Route changes of the last tick, committed by the workers at the start of the next
+        self.indices = {id(agent): index for index, agent in enumerate(self.agents)}
+        self.burned = [] # Indices of the agents the fire killed since the last tick
+        self.shared = SharedArrays()
+        self.fire = None
+        self.connections = []
+        self.processes = []
+        try:
+            self.__start(grid, fire_positions, workers, shared_objects, fire_listeners)
+        except BaseException:
+            self.close()
+            raise
+
+    def __start(self, grid, fire_positions, workers, shared_objects, fire_listeners):
+        self.shared.share(grid, ["cells", "wall_mask", "neighbors", "valid_actions", "has_valid_action"])
+        for obj, names in shared_objects:
+            self.shared.share(obj, names)
+
+        # Every burned cell in ignition order, appended after each spread
+        refs = (self.shared.put(np.zeros(grid.rows * grid.cols, dtype=np.int64)), self.shared.put(np.zeros(1, dtype=np.int64)))
+        self.fire = SharedFire(*(self.shared.view(ref) for ref in refs), refs)
+        self.publish(fire_positions)
+
+        # The occupancy indexes every agent object, so it is kept out of the shards (dispatch needs unlimited capacity)
+        occupancies = {id(agent): agent.occupancy for agent in self.agents if getattr(agent, 'occupancy', None) is not None}
+        seed = random.randrange(2**31)
+        context = multiprocessing.get_context()
+        try:
+            for agent in self.agents:
+                if id(agent) in occupancies:
+                    agent.occupancy = None
+            for worker in range(workers):
+                indices = list(range(worker, len(self.agents), workers))
+                if not indices:
+                    break
+                parent, child = context.Pipe()
+                process = context.Process(target=decision_worker, args=(child,), daemon=True)
+                process.start()
+                child.close()
+                self.connections.append(parent)
+                self.processes.append(process)
+                parent.send(([self.agents[i] for i in indices], indices, self.fire, fire_listeners, self.path_cache, seed))
+        finally:
+            for agent in self.agents:
+                if id(agent) in occupancies:
+                    agent.occupancy = occupancies[id(agent)]
+            for obj in [grid] + [obj for obj, _ in shared_objects]:
+                obj.shared = {}
+
+    def publish(self, new_fire_positions, burned_agents=()):
+        """ Append the newly ignited positions to the shared fire, the burned agents are sent with the next tick """
+        count = int(self.fire.count[0])
+        cells = [r * self.cols + c for r, c in new_fire_positions]
+        self.fire.cells[count:count + len(cells)] = cells
+        self.fire.count[0] = count + len(cells)
+        self.burned += [self.indices[id(agent)] for agent in burned_agents]
+
+    def move(self, tick):
+        """ Run the decisions of every alive agent for the tick, update the game's agents
+        and return id(agent) -> (status, nodes expanded, previous position) """
+        for connection in self.connections:
+            connection.send((tick, self.route_changes, self.burned))
+        self.burned = []
+        decisions = {}
+        route_changes = []
+        for connection in self.connections:
+            results, changes = connection.recv()
+            route_changes += changes
+            for index, status, position, distance_traveled, ticks, nodes_expanded, simulations in results:
+                agent = self.agents[index]
+                decisions[id(agent)] = status, nodes_expanded, agent.agent_position
+                agent.agent_position = position
+                agent.distance_traveled = distance_traveled
+                agent.ticks = ticks
+                agent.nodes_expanded = getattr(agent, 'nodes_expanded', 0) + nodes_expanded
+                agent.last_simulations = simulations
+        # Keys follow the agent order and the changes of one agent keep their order, as in the serial loop
+        self.route_changes = sorted(route_changes, key=lambda change: change[0])
+        if self.path_cache is not None:
+            self.path_cache.commit(self.route_changes)
+        return decisions
+
+    def close(self):
+        """ Stop the workers and remove the shared memory (safe to call more than once and after a failure) """
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except OSError: # The worker is gone
+                pass
+            connection.close()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.connections, self.processes = [], []
+        self.fire = None # Release the views before the blocks are closed
+        self.shared.close()
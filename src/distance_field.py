@@ -0,0 +1,105 @@
+import numpy as np
+from src.fire import expand_cells
+
+
+def nearest_distance(rows, cols, cells, open_mask=None):
+    """ float32 flat array of the distance from every cell to the nearest of the given flat cells (inf if there is none)
+
+    Without an open_mask this is the Manhattan distance; with one, paths only go through the open cells (walkable distance).
+    """
+    distances = np.full(rows * cols, np.inf, dtype=np.float32)
+    unvisited = np.ones(rows * cols, dtype=bool) if open_mask is None else open_mask.copy()
+    frontier = np.unique(np.asarray(cells, dtype=np.int64))
+    distance = 0
+    while frontier.size:
+        distances[frontier] = distance
+        unvisited[frontier] = False
+        frontier = expand_cells(frontier, rows, cols, allowed=unvisited)
+        distance += 1
+
+    return distances
+
+
+class FireDistanceField:
+    """ Distance from every cell to the nearest burning cell, updated incrementally as new cells ignite
+
+    An ignition only relaxes the cells whose distance decreases, so the cost follows the changed area
+    and not the size of the fire. With track_changes the overwritten values are logged so the field
+    can be rewound (snapshot/restore) like Fire.
+    """
+    def __init__(self, grid, fire_positions, walkable=False, track_changes=False):
+        self.rows, self.cols = grid.rows, grid.cols
+        self.open_mask = ~grid.wall_mask.ravel() if walkable else np.ones(self.rows * self.cols, dtype=bool)
+        self.distances = nearest_distance(self.rows, self.cols, self.__cells(fire_positions), self.open_mask if walkable else None)
+        self.track_changes = track_changes
+        self.changes = [] # (cells, previous distances) of every update, to rewind the field
+
+    def __cells(self, positions):
+        return np.array([r * self.cols + c for r, c in positions], dtype=np.int64)
+
+    def __set(self, cells, distance):
+        if self.track_changes:
+            self.changes.append((cells, self.distances[cells]))
+        self.distances[cells] = distance
+
+    def ignite(self, new_fire_positions):
+        """ Lower the distances around the newly ignited positions """
+        frontier = self.__cells(new_fire_positions)
+        frontier = frontier[self.distances[frontier] > 0]
+        self.__set(frontier, 0)
+        distance = 0
+        while frontier.size:
+            frontier = expand_cells(frontier, self.rows, self.cols, allowed=self.open_mask)
+            frontier = frontier[self.distances[frontier] > distance + 1]
+            self.__set(frontier, distance + 1)
+            distance += 1
+
+    def distance(self, position):
+        return float(self.distances[position[0] * self.cols + position[1]])
+
+    def fork(self, distances=None, track_changes=True):
+        """ Independent copy of the field (or of the given distances), tracking its changes to rewind training episodes """
+        field = FireDistanceField.__new__(FireDistanceField)
+        field.rows, field.cols = self.rows, self.cols
+        field.open_mask = self.open_mask
+        field.distances = (self.distances if distances is None else distances).copy()
+        field.track_changes = track_changes
+        field.changes = []
+        return field
+
+    def snapshot(self):
+        return len(self.changes)
+
+    def restore(self, snapshot):
+        """ Rewind the field to a snapshot (only with track_changes) """
+        while len(self.changes) > snapshot:
+            cells, distances = self.changes.pop()
+            self.distances[cells] = distances
+
+
+class RewardFields:
+    """ Nearest safety (static) and nearest fire (incremental) distance fields shared by the MCTS and Q-learning rewards
+
+    Distances are Manhattan by default, or true walkable-path distances around the walls.
+    """
+    def __init__(self, grid, safety_positions, fire_positions, walkable=False):
+        self.cols = grid.cols
+        open_mask = ~grid.wall_mask.ravel() if walkable else None
+        self.safety = nearest_distance(grid.rows, grid.cols, [r * grid.cols + c for r, c in safety_positions], open_mask)
+        self.fire = FireDistanceField(grid, fire_positions, walkable=walkable)
+        self.fire_levels = {0: self.fire.distances.copy()} # Fire distances after each spread of the forecast
+
+    def fire_distances_at(self, level, rings):
+        """ Fire distance array after the first level spreads of the forecast rings, computed once and shared by all agents """
+        distances = self.fire_levels.get(level)
+        if distances is None:
+            field = self.fire.fork(self.fire_distances_at(level - 1, rings), track_changes=False)
+            field.ignite(rings[level])
+            distances = self.fire_levels.setdefault(level, field.distances)
+        return distances
+
+    def safety_distance(self, position):
+        return float(self.safety[position[0] * self.cols + position[1]])
+
+    def fire_distance(self, position):
+        return self.fire.distance(position)
@@ -0,0 +1,60 @@
+import os
+import random
+import concurrent.futures
+import numpy as np
+from src.game import Game
+
+
+def run_game(game_map, seed, game_kwargs):
+    """ Run one game with its own seed and return (seed, ticks, safe, num_agents, objective, stats) """
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    for output in ("profile", "replay"): # One profile and replay log per run
+        if game_kwargs.get(output):
+            root, ext = os.path.splitext(game_kwargs[output])
+            if ext == ".gz":
+                root, inner = os.path.splitext(root)
+                ext = inner + ext
+            game_kwargs = {**game_kwargs, output: f"{root}-{seed}{ext}"}
+    game = Game(game_map, **game_kwargs)
+    tick, safe, num_agents, obj = game.run()
+
+    return seed, tick, safe, num_agents, obj, game.stats()
+
+
+def run_experiments(game_map, iterations, workers=1, seed=None, **game_kwargs):
+    """ Run the game iterations (over a process pool if workers > 1) and return the per-run results in order
+
+    The games of a process pool are not rendered: the processes would draw their frames over each other in the same
+    terminal. Only the per-run results are returned, for the caller to print.
+    """
+    if seed is None:
+        seed = random.randrange(2**31)
+    seeds = [seed + i for i in range(iterations)]
+
+    if workers <= 1:
+        return [run_game(game_map, s, game_kwargs) for s in seeds]
+
+    game_kwargs = {**game_kwargs, "render": "none"}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_game, game_map, s, game_kwargs) for s in seeds]
+        return [future.result() for future in futures]
+
+
+def summarize(results):
+    """ Aggregate statistics (mean and variance) of the per-run results """
+    _, ticks, safe, num_agents, objective = (np.array(values, dtype=float) for values in list(zip(*results))[:5])
+    saved_ratio = safe / num_agents
+
+    return {
+        "num_agents": int(num_agents[0]),
+        "saved_mean": saved_ratio.mean(),
+        "saved_var": saved_ratio.var(),
+        "time_mean": ticks.mean(),
+        "time_var": ticks.var(),
+        "objective_mean": objective.mean(),
+        "objective_var": objective.var(),
+        "objective_per_agent": (objective / num_agents).mean(),
+        "decisions": sum(stats["decisions"] for *_, stats in results),
+        "simulations": sum(stats["simulations"] for *_, stats in results),
+    }
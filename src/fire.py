@@ -1,16 +1,35 @@
 
 from random import choice
 from copy import deepcopy
+import numpy as np
 
 GOOD_BLOCKS = [".", " ", "="]
 PACMAN = "P"
 
 
+def expand_cells(cells, rows, cols, allowed=None):
+    """ Flat indices of the four neighbours of the given flat cell indices that are inside the map (without duplicates)
+
+    If given, the flat boolean mask allowed is applied before removing the duplicates, which keeps the sort small.
+    """
+    cell_rows, cell_cols = np.divmod(cells, cols)
+    neighbors = np.concatenate((
+        cells[cell_rows > 0] - cols,        # up
+        cells[cell_rows < rows - 1] + cols, # down
+        cells[cell_cols > 0] - 1,           # left
+        cells[cell_cols < cols - 1] + 1,    # right
+    ))
+    if allowed is not None:
+        neighbors = neighbors[allowed[neighbors]]
+    return np.unique(neighbors)
+
+
 class Fire:
-    def __init__(self, game_map, fire_positions):
-        self.game_map = game_map # Game map only with the wall and road
+    def __init__(self, grid, fire_positions):
+        self.grid = grid # Grid only with the wall and road
         self.fire_positions = set(fire_positions)  # Store multiple fire positions
         self.seen = set(fire_positions)  # Track fire positions to prevent duplicates
+        self.rings = [frozenset(self.fire_positions)] # Positions ignited by each spread (seeds first), to rewind the fire
 
     def __get_fire_expansion_possibilities(self, position):
         """ Get all possible expansion positions from a given fire position """
@@ -20,35 +39,55 @@ class Fire:
 
         for dx, dy in directions:
             new_row, new_col = row+dx, col+dy
-            if 0 <= new_row < len(self.game_map) and 0 <= new_col < len(self.game_map[0]):
+            if 0 <= new_row < self.grid.rows and 0 <= new_col < self.grid.cols:
                 if (new_row, new_col) not in self.seen:
                     possibilities.append((new_row, new_col))
 
         return possibilities
 
     def expand(self):
-        """ Expand fire in all four directions Used for QLearning training"""
-        # Update the fire positions
+        """ Expand fire in all four directions and return the newly ignited positions """
+        # Update the fire positions: the neighbours of the older rings already burn, only the newest ring can spread
         new_fire_positions = set()
-        for fire_position in self.fire_positions:
+        for fire_position in self.rings[-1]:
             possible_positions = self.__get_fire_expansion_possibilities(fire_position)
             for new_position in possible_positions:
                 new_fire_positions.add(new_position)
                 self.seen.add(new_position)
 
         self.fire_positions.update(new_fire_positions)  # Update fire positions list
+        self.rings.append(new_fire_positions)
+
+        return new_fire_positions
+
+    def snapshot(self):
+        """ Cheap handle of the current fire state: the number of spreads so far """
+        return len(self.rings)
+
+    def restore(self, snapshot):
+        """ Rewind the fire to a snapshot by removing the rings ignited since then (the map is never copied) """
+        while len(self.rings) > max(snapshot, 1):
+            ring = self.rings.pop()
+            self.fire_positions.difference_update(ring)
+            self.seen.difference_update(ring)
 
-    def move_fire(self, agent_agents):
-        """ Expand fire in all four directions """
+    def move_fire(self, agent_agents, occupancy=None, burning_positions=()):
+        """ Expand fire in all four directions
+
+        With an Occupancy of the agents, only the agents in the newly ignited cells and in the burning_positions
+        (the burning cells where agents stood after moving) are looked up (and removed from it) instead of checking every agent. """
         # Update the fire positions
-        new_fire_positions = set()
-        for fire_position in self.fire_positions:
-            possible_positions = self.__get_fire_expansion_possibilities(fire_position)
-            for new_position in possible_positions:
-                new_fire_positions.add(new_position)
-                self.seen.add(new_position)
+        new_fire_positions = self.expand()
 
-        self.fire_positions.update(new_fire_positions)  # Update fire positions list
+        if occupancy is not None:
+            doomed = occupancy.agents_in(new_fire_positions | set(burning_positions))
+            if not doomed:
+                return agent_agents, 0
+            for agent_agent in doomed:
+                occupancy.remove(agent_agent, agent_agent.agent_position)
+            doomed = {id(agent_agent) for agent_agent in doomed}
+            new_agent_agents = [agent_agent for agent_agent in agent_agents if id(agent_agent) not in doomed]
+            return new_agent_agents, len(agent_agents) - len(new_agent_agents)
 
         # Update the agent agents
         new_agent_agents = []
@@ -59,4 +98,56 @@ class Fire:
         # Update the dead number of agent agents
         dead_num = len(agent_agents) - len(new_agent_agents)
 
-        return new_agent_agents, dead_num
\ No newline at end of file
+        return new_agent_agents, dead_num
+
+
+class FrontierFire(Fire):
+    """ Fire that only spreads from its newest ring of cells and never burns through walls """
+    def __init__(self, grid, fire_positions, walls_block=True):
+        super().__init__(grid, fire_positions)
+        self.seen = self.fire_positions # The burned mask already prevents duplicates
+        self.rows, self.cols = grid.rows, grid.cols
+
+        # Flat boolean masks of the map
+        if walls_block:
+            self.wall_mask = grid.wall_mask.ravel()
+        else:
+            self.wall_mask = np.zeros(self.rows * self.cols, dtype=bool)
+        self.burned = np.zeros(self.rows * self.cols, dtype=bool)
+
+        # Only the newest ring of burning cells can spread further
+        self.frontier = np.array([r * self.cols + c for r, c in self.fire_positions], dtype=np.int64)
+        self.burned[self.frontier] = True
+        self.flammable = ~self.wall_mask & ~self.burned # Cells the fire can still reach
+        self.ring_cells = [self.frontier] # Flat indices of each ring, to rewind the frontier
+
+    def expand(self):
+        """ Dilate the frontier by one cell over the open cells and return the newly ignited positions """
+        candidates = expand_cells(self.frontier, self.rows, self.cols, allowed=self.flammable)
+
+        self.burned[candidates] = True
+        self.flammable[candidates] = False
+        self.frontier = candidates
+
+        new_rows, new_cols = np.divmod(candidates, self.cols)
+        new_fire_positions = set(zip(new_rows.tolist(), new_cols.tolist()))
+        self.fire_positions.update(new_fire_positions)
+        self.rings.append(new_fire_positions)
+        self.ring_cells.append(candidates)
+
+        return new_fire_positions
+
+    def restore(self, snapshot):
+        """ Rewind the fire to a snapshot and make the last remaining ring the frontier again """
+        while len(self.rings) > max(snapshot, 1):
+            cells = self.ring_cells.pop()
+            self.burned[cells] = False
+            self.flammable[cells] = True
+            self.fire_positions.difference_update(self.rings.pop())
+        self.frontier = self.ring_cells[-1]
+
+
+FIRE_ENGINES = {
+    "classic": Fire,
+    "frontier": FrontierFire,
+}
@@ -0,0 +1,59 @@
+import numpy as np
+from src.fire import FrontierFire
+
+NEVER = np.iinfo(np.int32).max # Arrival tick of the cells the fire never reaches
+
+
+class FireForecast:
+    """ Tick at which the fire reaches every cell, computed once with a multi-source BFS from the fire seeds
+
+    The fire spreads at the end of every `fire_ticks`-th tick, so the cells of the k-th ring
+    are burning from tick k * fire_ticks on (the seeds from tick 0).
+    """
+    def __init__(self, grid, fire_positions, fire_ticks, walls_block=False):
+        self.fire_ticks = fire_ticks
+        self.rows, self.cols = grid.rows, grid.cols
+        self.arrival = np.full((self.rows, self.cols), NEVER, dtype=np.int32)
+        self.rings = [] # Positions that ignite at each spread step
+        self.__positions_cache = {}
+        self.shared = {} # Attribute -> handle of the arrays placed in shared memory (see src.dispatch)
+
+        # Breadth-first search is the fire itself spreading until it stops
+        fire = FrontierFire(grid, fire_positions, walls_block=walls_block)
+        new_fire_positions = set(fire.fire_positions)
+        while new_fire_positions:
+            self.arrival.flat[fire.frontier] = len(self.rings) * fire_ticks
+            self.rings.append(new_fire_positions)
+            new_fire_positions = fire.expand()
+
+    def __getstate__(self):
+        """ Pickled state: the arrays placed in shared memory are sent as handles and the cache is left out """
+        state = self.__dict__.copy()
+        state.update(self.shared)
+        state.update(shared={}, _FireForecast__positions_cache={})
+        return state
+
+    def arrival_tick(self, position):
+        """ Tick from which the position is burning (NEVER if the fire never reaches it) """
+        return int(self.arrival[position[0], position[1]])
+
+    def is_burning(self, position, tick):
+        """ Check if the position is burning at the given tick """
+        return self.arrival[position[0], position[1]] <= tick
+
+    def ticks_until_fire(self, position, tick):
+        """ Number of ticks left before the fire reaches the position """
+        return int(self.arrival[position[0], position[1]]) - tick
+
+    def fire_positions_at(self, tick):
+        """ Set of the positions burning at the given tick """
+        level = min(max(tick, 0) // self.fire_ticks, len(self.rings) - 1)
+        if level < 0:
+            return frozenset()
+        if level not in self.__positions_cache:
+            positions = set()
+            for ring in self.rings[:level + 1]:
+                positions.update(ring)
+            self.__positions_cache[level] = frozenset(positions)
+
+        return self.__positions_cache[level]
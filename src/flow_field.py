@@ -0,0 +1,76 @@
+import numpy as np
+from src.agent_base import AgentBase
+from src.fire import expand_cells
+
+UNREACHABLE = -1 # Distance of the cells from which no safety position can be reached
+
+
+class FlowField:
+    """ Walking distance from every cell to the nearest safety position, shared by all agents
+
+    The field is a multi-source reverse BFS from all the safety positions that avoids walls,
+    fire and fire-adjacent cells (like AgentAStar). It is only recomputed when the fire has changed.
+    """
+    def __init__(self, grid, safety_positions):
+        self.grid = grid
+        self.rows, self.cols = grid.rows, grid.cols
+        self.wall_mask = grid.wall_mask.ravel()
+        self.safety_cells = np.array([r * self.cols + c for r, c in safety_positions], dtype=np.int64)
+        self.distances = None
+        self.fire_size = None # Size of the fire the field was computed for (the fire only grows)
+
+    def update(self, fire_positions):
+        """ Recompute the field if the fire has spread since the last update """
+        if self.fire_size == len(fire_positions):
+            return
+        self.fire_size = len(fire_positions)
+
+        fire_cells = np.array([r * self.cols + c for r, c in fire_positions], dtype=np.int64)
+        blocked = self.wall_mask.copy()
+        blocked[fire_cells] = True
+        blocked[expand_cells(fire_cells, self.rows, self.cols)] = True
+
+        distances = np.full(self.rows * self.cols, UNREACHABLE, dtype=np.int32)
+        unvisited = ~blocked
+        frontier = self.safety_cells[unvisited[self.safety_cells]]
+        distance = 0
+        while frontier.size:
+            distances[frontier] = distance
+            unvisited[frontier] = False
+            frontier = expand_cells(frontier, self.rows, self.cols, allowed=unvisited)
+            distance += 1
+
+        self.distances = distances.reshape(self.rows, self.cols)
+
+    def next_position(self, position, fire_positions):
+        """ Step downhill to the neighbour closest to a safety position (stay if none can reach one) """
+        self.update(fire_positions)
+        best_position, best_distance = position, None
+        for _, neighbor in self.grid.valid_moves(position):
+            distance = self.distances[neighbor]
+            if distance != UNREACHABLE and (best_distance is None or distance < best_distance):
+                best_position, best_distance = neighbor, distance
+
+        return best_position
+
+
+class AgentFlowField(AgentBase):
+    """ Agent that follows the shared evacuation flow field instead of running its own search """
+    def __init__(self, grid, agent_position, safety_positions, flow_field, fire_forecast=None):
+        super().__init__(grid, agent_position, safety_positions, fire_forecast)
+        self.flow_field = flow_field
+
+    def move_agent(self, fire_positions):
+        """ Move Agent and return agent status (0: Dead, 1: Alive, 2: Safe)"""
+        new_position = self.flow_field.next_position(self.agent_position, fire_positions)
+
+        self.agent_position = new_position
+        self.distance_traveled += 1
+        self.ticks += 1
+
+        if new_position in fire_positions:
+            return 0
+        elif new_position in self.safety_positions:
+            return 2
+        else:
+            return 1
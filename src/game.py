@@ -1,105 +1,356 @@
-import time
 from src.agent_base import AgentBase
 from src.agent_mcts import AgentMCTS
-from src.agent_qlearning import AgentQLearning
-from src.agent_astar import AgentAStar 
-from src.fire import Fire
-import os
-from copy import deepcopy
+from src.agent_qlearning import AgentQLearning, init_training_worker, train_q_table
+from src.agent_astar import AgentAStar, AgentSpaceTimeAStar
+from src.flow_field import FlowField, AgentFlowField
+from src.crowd import Crowd, DEAD, ALIVE, SAFE
+from src.rollout import BatchRollout
+from src.distance_field import RewardFields
+from src.fire import FIRE_ENGINES
+from src.fire_forecast import FireForecast
+from src.renderer import make_renderer
+from src.profiler import Profiler
+from src.replay import ReplayWriter
+from src.occupancy import Occupancy
+from src.dispatch import DecisionDispatcher
+from src.path_cache import PathCache
+import numpy as np
+from src.maps import parse_map
+from src.policy_cache import PolicyCache
 import concurrent.futures
+import random
+import warnings
 
 FIRE_TICKS = 2 # Determine how often the fire spreads
+RANDOM_METHODS = ['Random', 'MCTS'] # Methods whose moves draw from the random generators
 
 
 class Game:
-    def __init__(self, game_map, method='Random', rollout=100, end_ticks=7):
-        self.game_map, agent_positions, fire_positions, self.safety_positions = self.__read_map(game_map)
-        if method == 'Random':
-            self.agents = [AgentBase(self.game_map, pos, self.safety_positions) for pos in agent_positions]  # Use based Agent
+    def __init__(self, game_map, method='Random', rollout=100, end_ticks=7, render='terminal', render_every=10, fire_engine='classic', engine='objects', training='thread', policy_cache=None, rollout_batch=0, distance='manhattan', time_budget_ms=None, profile=None, replay=None, render_viewport=None, render_scale=0, capacity=0, decision_workers=0, forecast_pruning=False):
+        self.grid, agent_positions, fire_positions, self.safety_positions = self.__read_map(game_map)
+        fire_class = FIRE_ENGINES[fire_engine] # classic or frontier (wall-aware)
+        # Tick at which the fire reaches every cell, shared by all the planners
+        self.fire_forecast = FireForecast(self.grid, fire_positions, FIRE_TICKS, walls_block=fire_engine == 'frontier')
+        # A* pruning of the doomed cells and the future burns of the MCTS rewards are opt-in, they change the plans
+        planner_forecast = self.fire_forecast if forecast_pruning else None
+        self.reward_fields = None # Nearest safety / fire distance fields of the MCTS and Q-learning rewards
+        if method in ['MCTS', 'Qlearning']:
+            self.reward_fields = RewardFields(self.grid, self.safety_positions, fire_positions, walkable=distance == 'walkable')
+        # Agents per cell, with at most capacity agents in a cell (0: unlimited) and the agent objects indexed by cell
+        self.occupancy = Occupancy(self.grid, capacity, self.safety_positions)
+        self.path_cache = None
+        self.crowd = None # Struct-of-arrays agents of the vectorized engine
+        if engine == 'vectorized':
+            flow_field = FlowField(self.grid, self.safety_positions) if method == 'FlowField' else None
+            self.crowd = Crowd(self.grid, agent_positions, self.safety_positions, fire_positions, policy=method, flow_field=flow_field, occupancy=self.occupancy)
+            self.agents = []
+        elif method == 'Random':
+            self.agents = [AgentBase(self.grid, pos, self.safety_positions, self.fire_forecast) for pos in agent_positions]  # Use based Agent
         elif method == 'MCTS':
-            self.agents = [AgentMCTS(self.game_map, pos, self.safety_positions, simulations=rollout, end_ticks = end_ticks) for pos in agent_positions]  # Use MCTS-based Agent
+            # Rollouts are run one by one, or in vectorized batches of rollout_batch leaves by one shared engine
+            rollout_engine = BatchRollout(self.grid, self.safety_positions, self.reward_fields, planner_forecast) if rollout_batch > 0 else None
+            self.agents = [AgentMCTS(self.grid, pos, self.safety_positions, simulations=rollout, end_ticks = end_ticks, fire_forecast=planner_forecast, rollout_engine=rollout_engine, batch_size=rollout_batch, reward_fields=self.reward_fields, time_budget_ms=time_budget_ms) for pos in agent_positions]  # Use MCTS-based Agent
         elif method == 'Qlearning':
-            self.agents = [AgentQLearning(self.game_map, pos, self.safety_positions) for pos in agent_positions]
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                futures = [executor.submit(agent.learn, Fire(self.game_map, fire_positions), i, FIRE_TICKS, rollout) for i, agent in enumerate(self.agents)]
-                concurrent.futures.wait(futures)  # Wait for all agents to finish
+            self.agents = [AgentQLearning(self.grid, pos, self.safety_positions, fire_forecast=self.fire_forecast, reward_fields=self.reward_fields) for pos in agent_positions]
+            self.__train_qlearning(fire_class, fire_positions, agent_positions, rollout, training, fire_engine, policy_cache, distance)
         elif method == 'AStar':
-            self.agents = [AgentAStar(self.game_map, pos, self.safety_positions) for pos in agent_positions]
+            self.path_cache = PathCache(self.grid, fire_positions) # Routes kept until the fire reaches them, shared between the agents
+            self.agents = [AgentAStar(self.grid, pos, self.safety_positions, planner_forecast, self.occupancy, self.path_cache) for pos in agent_positions]
+        elif method == 'SpaceTimeAStar':
+            self.agents = [AgentSpaceTimeAStar(self.grid, pos, self.safety_positions, self.fire_forecast, occupancy=self.occupancy) for pos in agent_positions]
+        elif method == 'FlowField':
+            flow_field = FlowField(self.grid, self.safety_positions) # One field shared by every agent
+            self.agents = [AgentFlowField(self.grid, pos, self.safety_positions, flow_field, self.fire_forecast) for pos in agent_positions]
 
-        self.agent_num = len(self.agents) # Number of agents
-        self.fire = Fire(self.game_map, fire_positions)
+        self.agent_num = self.crowd.size if self.crowd is not None else len(self.agents) # Number of agents
+        for agent in self.agents:
+            self.occupancy.add(agent, agent.agent_position)
+        self.fire = fire_class(self.grid, fire_positions)
         self.ticks = 0
         self.safe = 0 # Number of safe agents
         self.dead = 0 # Number of dead agents
         self.total_distance_traveled = 0
+        self.decisions = 0 # Number of planner decisions that report simulations (MCTS)
+        self.simulations = 0 # Number of simulations completed over these decisions
+        self.renderer = make_renderer(render, render_every, render_viewport, render_scale) # none, terminal, every, final or diff
+        self.profiler = Profiler() if profile else None # Spans and per-tick counters, written to the profile path at the end
+        self.profile_path = profile
+        self.replay = None # Streaming log of the per-tick deltas
+        if replay:
+            self.replay = ReplayWriter(replay, self.grid, agent_positions, fire_positions, self.safety_positions, FIRE_TICKS)
+            self.agent_ids = {id(agent): i for i, agent in enumerate(self.agents)} # Replay ids of the agent objects
+        self.dispatcher = None # Worker processes running the agent decisions of every tick in parallel
+        if decision_workers > 1:
+            if self.crowd is not None or capacity > 0:
+                raise ValueError("Parallel decisions need the objects engine and unlimited capacity (the decisions must be independent)")
+            if method in RANDOM_METHODS:
+                warnings.warn(
+                    f"{method} agents are seeded per agent and tick by the decision workers: the runs are reproducible "
+                    "whatever the number of workers but differ from the runs in one process", stacklevel=2
+                )
+            fire_listeners = [self.reward_fields.fire] if self.reward_fields is not None else [] # Updated with the ignited positions
+            if self.path_cache is not None:
+                fire_listeners.append(self.path_cache)
+            self.dispatcher = DecisionDispatcher(
+                self.agents, self.grid, self.fire.fire_positions, decision_workers,
+                shared_objects=[(self.fire_forecast, ["arrival"])], fire_listeners=fire_listeners, path_cache=self.path_cache
+            )
+
+    def __train_qlearning(self, fire_class, fire_positions, agent_positions, rollout, training, fire_engine, policy_cache=None, distance='manhattan'):
+        """ Train the Q-learning agents: thread (one table per agent), process (one table per agent over a process pool)
+        or shared (one table trained from all the start positions and used by every agent).
+        With a policy cache (PolicyCache or directory), cached tables are loaded and only the missing ones are trained. """
+        if training not in ['thread', 'process', 'shared']:
+            raise ValueError(f"Unknown training mode: {training}")
+        if not self.agents:
+            return
+        if isinstance(policy_cache, str):
+            policy_cache = PolicyCache(policy_cache)
+
+        # Cache keys of the table of each agent (the same one for a shared table)
+        keys = [None] * len(self.agents)
+        if policy_cache is not None:
+            params = dict(
+                fire_engine=fire_engine, distance=distance, episodes=rollout, learning_rate=self.agents[0].learning_rate,
+                discount_factor=self.agents[0].discount_factor, epsilon=self.agents[0].epsilon
+            )
+            if training == 'shared':
+                keys = [PolicyCache.key(self.grid, fire_positions, self.safety_positions, FIRE_TICKS, start_positions=sorted(agent_positions), **params)] * len(self.agents)
+            else:
+                keys = [PolicyCache.key(self.grid, fire_positions, self.safety_positions, FIRE_TICKS, start_position=pos, **params) for pos in agent_positions]
+
+        missing = [] # Agents whose table has to be trained
+        loaded = {}
+        for i, (agent, key) in enumerate(zip(self.agents, keys)):
+            if policy_cache is not None and key not in loaded:
+                loaded[key] = policy_cache.load(key)
+            q_table = loaded.get(key)
+            if q_table is None:
+                missing.append(i)
+            else:
+                agent.q_table = q_table
+
+        if not missing:
+            return
+        if training == 'thread':
+            with concurrent.futures.ThreadPoolExecutor() as executor:
+                futures = [executor.submit(self.agents[i].learn, fire_class(self.grid, fire_positions), i, FIRE_TICKS, rollout) for i in missing]
+                concurrent.futures.wait(futures)  # Wait for all agents to finish
+        elif training == 'process':
+            initargs = (self.grid, self.safety_positions, self.fire_forecast, fire_class(self.grid, fire_positions), self.reward_fields)
+            with concurrent.futures.ProcessPoolExecutor(initializer=init_training_worker, initargs=initargs) as executor:
+                futures = [executor.submit(train_q_table, agent_positions[i], i, FIRE_TICKS, rollout, random.randrange(2**31)) for i in missing]
+                for i, future in zip(missing, futures):
+                    self.agents[i].q_table = future.result()
+        elif training == 'shared':
+            trainer = self.agents[0]
+            trainer.learn(fire_class(self.grid, fire_positions), 'shared', FIRE_TICKS, rollout, start_positions=agent_positions)
+            for agent in self.agents:
+                agent.q_table = trainer.q_table
+            missing = missing[:1]
+
+        if policy_cache is not None:
+            for i in missing:
+                policy_cache.store(keys[i], self.agents[i].q_table)
+            policy_cache.evict() # Once for the whole batch
 
     def run(self):
         """ Run the game"""
-        
-        while True:
-            # Check if the game is ended
-            if self.__check_end():
-                return self.ticks, self.safe, self.agent_num, self.total_distance_traveled
+        try:
+            while True:
+                # Check if the game is ended
+                if self.__check_end():
+                    self.renderer.finish(self)
+                    if self.profiler is not None:
+                        self.profiler.export(self.profile_path)
+                    if self.replay is not None:
+                        self.replay.close(self.ticks, self.safe, self.dead)
+                    return self.ticks, self.safe, self.agent_num, self.total_distance_traveled
 
-            time.sleep(0.5)
-            
-            # Update each agent position
-            new_agents = []
-            for i, agent in enumerate(self.agents):
+                if self.crowd is None:
+                    self.__move_agents()
+                else:
+                    self.__move_crowd()
+
+                # Update the tick and render the map
+                self.ticks += 1
+                if self.profiler is None:
+                    self.renderer.render(self)
+                else:
+                    start = self.profiler.now()
+                    self.renderer.render(self)
+                    self.profiler.record("render", start, self.ticks - 1)
+        finally:
+            if self.dispatcher is not None:
+                self.dispatcher.close() # Also after a failure, so no worker or shared memory block is left behind
+
+    def __move_agents(self):
+        """ Move the agent objects one by one, then the fire """
+        profiler = self.profiler
+        simulations = self.simulations
+        nodes_expanded = 0
+        replay = self.replay
+        occupancy = self.occupancy
+        moved, saved, dead, ignited = [], [], [], () # Deltas of the tick for the replay log
+        burning_positions = [] # Burning cells alive agents stand on (move_agent may judge the status from another cell)
+
+        if self.dispatcher is not None:
+            start = profiler.now() if profiler is not None else None
+            decisions = self.dispatcher.move(self.ticks)
+            if profiler is not None:
+                profiler.record("dispatch", start, self.ticks)
+
+        # Update each agent position
+        new_agents = []
+        for i, agent in enumerate(self.agents):
+            position = agent.agent_position
+            if self.dispatcher is not None:
+                agent_status, expanded, position = decisions[id(agent)] # Already moved by the workers
+                nodes_expanded += expanded
+            elif profiler is None:
                 agent_status = self.agents[i].move_agent(self.fire.fire_positions)
-                
-                # Check the status of the agent and update the statics
-                if agent_status == 0: # Dead
-                    self.dead += 1
-                elif agent_status == 1: # Alive
-                    new_agents.append(agent)
-                elif agent_status == 2: # Saved
-                    self.total_distance_traveled += self.agents[i].distance_traveled
-                    self.safe += 1
+            else:
+                expanded = getattr(agent, 'nodes_expanded', 0)
+                start = profiler.now()
+                agent_status = self.agents[i].move_agent(self.fire.fire_positions)
+                profiler.record(f"move_agent[{type(agent).__name__}]", start, self.ticks, profiler.agent_index(agent))
+                nodes_expanded += getattr(agent, 'nodes_expanded', 0) - expanded
+            if isinstance(agent, AgentMCTS):
+                self.decisions += 1
+                self.simulations += agent.last_simulations
+
+            # Keep the agent in place if its target cell is full, otherwise update the occupancy
+            if agent_status == 1:
+                if agent.agent_position != position and not occupancy.has_room(agent.agent_position):
+                    agent.agent_position = position # Waiting still counts as a tick of travel, like a planner staying put
+                else:
+                    occupancy.move(agent, position, agent.agent_position)
+                if agent.agent_position in self.fire.fire_positions:
+                    burning_positions.append(agent.agent_position)
+            else:
+                occupancy.remove(agent, position)
+            
+            if replay is not None:
+                agent_id = self.agent_ids[id(agent)]
+                if agent.agent_position != position:
+                    moved.append((agent_id, agent.agent_position))
+                if agent_status == 0:
+                    dead.append(agent_id)
+                elif agent_status == 2:
+                    saved.append(agent_id)
+
+            # Check the status of the agent and update the statics
+            if agent_status == 0: # Dead
+                self.dead += 1
+            elif agent_status == 1: # Alive
+                new_agents.append(agent)
+            elif agent_status == 2: # Saved
+                self.total_distance_traveled += self.agents[i].distance_traveled
+                self.safe += 1
+
+        self.agents = new_agents
+        if self.path_cache is not None:
+            self.path_cache.commit() # The routes planned during the tick are seen from the next one (the dispatcher commits its own)
 
-            self.agents = new_agents
+        # Fire moves after every few ticks
+        if self.ticks % FIRE_TICKS == FIRE_TICKS - 1:
+            start = profiler.now() if profiler is not None else None
+            agents = self.agents
+            self.agents, dead_num = self.fire.move_fire(self.agents, occupancy, burning_positions)
+            self.dead += dead_num
+            if self.reward_fields is not None:
+                self.reward_fields.fire.ignite(self.fire.rings[-1]) # Newly ignited positions
+            if self.path_cache is not None:
+                self.path_cache.ignite(self.fire.rings[-1])
+            burned = []
+            if dead_num:
+                survivors = {id(agent) for agent in self.agents}
+                burned = [agent for agent in agents if id(agent) not in survivors]
+            if self.dispatcher is not None:
+                self.dispatcher.publish(self.fire.rings[-1], burned) # The workers stop moving the burned agents
+            if profiler is not None:
+                profiler.record("fire.move_fire", start, self.ticks)
+            if replay is not None:
+                ignited = self.fire.rings[-1]
+                dead += [self.agent_ids[id(agent)] for agent in burned]
 
-            # Fire moves after every few ticks
-            if self.ticks % FIRE_TICKS == FIRE_TICKS - 1:
-                self.agents, dead_num = self.fire.move_fire(self.agents)
-                self.dead += dead_num
+        if replay is not None:
+            replay.tick(self.ticks, moved, ignited, saved, dead)
 
-            # Clear the terminal
-            os.system('cls' if os.name == 'nt' else 'clear')
+        if profiler is not None:
+            self.__count(simulations=self.simulations - simulations, nodes_expanded=nodes_expanded, alive=len(self.agents))
 
-            # Update the tick and print the map
-            self.ticks += 1
-            self.print_game()
+    def __move_crowd(self):
+        """ Move all the agents with one vectorized step, then the fire """
+        profiler = self.profiler
+        replay = self.replay
+        if replay is not None:
+            positions, status = self.crowd.positions.copy(), self.crowd.status.copy()
+        start = profiler.now() if profiler is not None else None
+        safe, dead, distance = self.crowd.step(self.fire.fire_positions)
+        self.safe += safe
+        self.dead += dead
+        self.total_distance_traveled += distance
+        if profiler is not None:
+            profiler.record("crowd.step", start, self.ticks)
 
+        # Fire moves after every few ticks
+        if self.ticks % FIRE_TICKS == FIRE_TICKS - 1:
+            start = profiler.now() if profiler is not None else None
+            ignited = self.fire.expand()
+            self.dead += self.crowd.ignite(ignited)
+            if profiler is not None:
+                profiler.record("fire.expand", start, self.ticks)
+        else:
+            ignited = ()
 
+        if replay is not None:
+            moved = np.flatnonzero(self.crowd.positions != positions)
+            rows, cols = np.divmod(self.crowd.positions[moved], self.grid.cols)
+            replay.tick(
+                self.ticks, list(zip(moved.tolist(), zip(rows.tolist(), cols.tolist()))), ignited,
+                np.flatnonzero((self.crowd.status == SAFE) & (status != SAFE)).tolist(),
+                np.flatnonzero((self.crowd.status == DEAD) & (status != DEAD)).tolist(),
+            )
+
+        if profiler is not None:
+            self.__count(alive=self.crowd.alive_count())
+
+    def __count(self, **counters):
+        """ Record the counters of the tick with the fire and outcome ones """
+        self.profiler.count(
+            self.ticks, **counters, safe=self.safe, dead=self.dead,
+            fire_size=len(self.fire.fire_positions), fire_frontier=len(self.fire.rings[-1]),
+        )
+
+    def stats(self):
+        """ Extra statistics of the run """
+        stats = {"decisions": self.decisions, "simulations": self.simulations}
+        if self.profiler is not None:
+            stats["latency"] = self.profiler.summary()
+        return stats
+
+    def agent_positions(self):
+        """ Positions of the alive agents """
+        if self.crowd is not None:
+            return self.crowd.alive_positions()
+        return [agent.agent_position for agent in self.agents]
+
+    def agent_cells(self):
+        """ Flat cell indices of the alive agents """
+        if self.crowd is not None:
+            return self.crowd.positions[self.crowd.status == ALIVE]
+        return np.array([r * self.grid.cols + c for r, c in self.agent_positions()], dtype=np.int64)
 
     def __read_map(self, game_map):
-        """ Read game map to get clean map with road and wall and get agent positions, fire positions, and safety positions """
-        agent_positions = []
-        fire_positions = []
-        safety_positions = []
-
-        for r in range(len(game_map)):
-            for c in range(len(game_map[0])):
-                if game_map[r][c] == 'P':
-                    agent_positions.append((r,c))
-                    game_map[r][c] = ' '
-                elif game_map[r][c] == 'F':
-                    fire_positions.append((r,c))
-                    game_map[r][c] = ' ' 
-                elif game_map[r][c] == 'S':
-                    safety_positions.append((r,c))
-                    game_map[r][c] = ' ' 
-
-        return game_map, agent_positions, fire_positions, safety_positions
-        
+        """ Read game map to get the grid with road and wall and get agent positions, fire positions, and safety positions """
+        return parse_map(game_map)
 
     def __get_output_map(self):
         """ Get the map array with its status """
-        output_map = deepcopy(self.game_map)
+        output_map = self.grid.to_rows()
 
-        for agent in self.agents:
-            agent_position = agent.agent_position
+        for agent_position in self.agent_positions():
             output_map[agent_position[0]][agent_position[1]] = 'P'
         
         for fire_position in self.fire.fire_positions:
@@ -115,15 +366,14 @@ class Game:
         output_map = self.__get_output_map()
         qnt_lines = len(output_map)
         qnt_columns = len(output_map[0])
-        print(f"Ticks: {self.ticks}, Safe: {self.safe}, Dead: {self.dead}, Objective Function: {self.total_distance_traveled}")
+        lines = [f"Ticks: {self.ticks}, Safe: {self.safe}, Dead: {self.dead}, Objective Function: {self.total_distance_traveled}"]
         for i in range(qnt_lines):
-            for j in range(qnt_columns):
-                print(output_map[i][j], end=" ")
-            print()
+            lines.append(" ".join(output_map[i][j] for j in range(qnt_columns)) + " ")
+        print("\n".join(lines)) # One write for the whole frame
 
     def __check_end(self):
         """ Check if the all the agent has already been dead or safe """
+        if self.crowd is not None:
+            return self.crowd.alive_count() == 0
         if len(self.agents) == 0:
-            print(f"Game ended")
-            print(f"With {self.agent_num} Agents")
             return True
\ No newline at end of file
@@ -0,0 +1,92 @@
+import numpy as np
+from src.agent_base import WALL, ACTIONS, DIRECTION_MAP
+
+# Cell codes of the grid
+ROAD_CELL = 0
+WALL_CELL = 1
+
+
+def map_codes(game_map):
+    """ uint8 (rows, cols) array of the character codes of a map given as rows of characters, a character array or a code array """
+    if isinstance(game_map, np.ndarray) and game_map.dtype == np.uint8:
+        return game_map # Already codes (possibly memory-mapped), not copied
+    chars = np.asarray(game_map)
+    if chars.dtype.kind == 'U' and chars.dtype.itemsize == 4:
+        return chars.view(np.uint32).astype(np.uint8)
+    if chars.dtype.kind == 'S' and chars.dtype.itemsize == 1:
+        return chars.view(np.uint8)
+    raise ValueError(f"Map cells must be single characters, got {chars.dtype}")
+
+
+class Grid:
+    """ Compact array-backed map shared by the game, the fire and every agent
+
+    cells:         uint8 (rows, cols) array of cell codes
+    wall_mask:     bool (rows, cols) array, True on walls
+    neighbors:     int32 (rows, cols, 4) flat index of the neighbour reached by each action (-1 if not allowed)
+    valid_actions: bool (rows, cols, 4) mask of the actions allowed from each cell (in ACTIONS order)
+    has_valid_action: bool (rows, cols) array, True on cells with at least one valid action
+    """
+    def __init__(self, game_map):
+        self.cells = np.where(map_codes(game_map) == ord(WALL), WALL_CELL, ROAD_CELL).astype(np.uint8)
+        self.rows, self.cols = self.cells.shape
+        self.wall_mask = self.cells == WALL_CELL
+
+        # Neighbour table, built once for every cell and action from shifted copies of the road mask
+        road = ~self.wall_mask
+        self.valid_actions = np.zeros((self.rows, self.cols, len(ACTIONS)), dtype=bool)
+        offsets = np.zeros(len(ACTIONS), dtype=np.int32)
+        for action, name in ACTIONS.items():
+            dr, dc = DIRECTION_MAP[name]
+            self.valid_actions[max(0, -dr):self.rows - max(0, dr), max(0, -dc):self.cols - max(0, dc), action] = \
+                road[max(0, dr):self.rows + min(0, dr), max(0, dc):self.cols + min(0, dc)]
+            offsets[action] = dr * self.cols + dc
+        flat = np.arange(self.rows * self.cols, dtype=np.int32).reshape(self.rows, self.cols, 1)
+        self.neighbors = np.where(self.valid_actions, flat + offsets, np.int32(-1))
+        self.has_valid_action = self.valid_actions.any(axis=2)
+
+        self.__moves = {} # Per-position cache of the valid moves as Python tuples
+        self.__action_penalty = None
+        self.shared = {} # Attribute -> handle of the arrays placed in shared memory (see src.dispatch)
+
+    def __getstate__(self):
+        """ Pickled state: the arrays placed in shared memory are sent as handles and the caches are left out """
+        state = self.__dict__.copy()
+        state.update(self.shared)
+        state.update(shared={}, _Grid__moves={}, _Grid__action_penalty=None)
+        return state
+
+    @property
+    def action_penalty(self):
+        """ float32 (rows, cols, 4) array: 0 for the valid actions and -inf for the others, added to Q-values for masked argmax/max """
+        if self.__action_penalty is None:
+            self.__action_penalty = np.where(self.valid_actions, 0, -np.inf).astype(np.float32)
+        return self.__action_penalty
+
+    @property
+    def shape(self):
+        return self.rows, self.cols
+
+    def is_wall(self, position):
+        return bool(self.wall_mask[position[0], position[1]])
+
+    def valid_moves(self, position):
+        """ Tuple of the (action, new position) pairs allowed from the position """
+        moves = self.__moves.get(position)
+        if moves is None:
+            moves = tuple(
+                (action, divmod(int(neighbor), self.cols))
+                for action, neighbor in enumerate(self.neighbors[position[0], position[1]])
+                if neighbor >= 0
+            )
+            self.__moves[position] = moves
+
+        return moves
+
+    def valid_action_ids(self, position):
+        """ List of the action indices allowed from the position """
+        return [action for action, _ in self.valid_moves(position)]
+
+    def to_rows(self):
+        """ Map as a list of lists of characters (road and wall only) """
+        return [[WALL if cell == WALL_CELL else ' ' for cell in row] for row in self.cells.tolist()]
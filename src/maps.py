@@ -0,0 +1,170 @@
+import os
+import random
+import numpy as np
+from src.agent_base import WALL
+from src.grid import Grid, map_codes
+
+# Map characters besides WALL and road
+AGENT = 'P'
+FIRE = 'F'
+SAFETY = 'S'
+ROAD = ' '
+
+# Built-in 22x19 map: walls '=', agents 'P', fire 'F' and safety 'S'
+DEFAULT_MAP = [
+    ['=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '='],
+    ['=', 'S', ' ', ' ', ' ', '=', 'P', ' ', ' ', ' ', 'P', ' ', '=', ' ', ' ', ' ', ' ', 'S', '='],
+    ['=', ' ', ' ', 'P', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '=', ' ', ' ', ' ', '=', ' ', '='],
+    ['=', ' ', ' ', ' ', ' ', '=', ' ', ' ', ' ', ' ', ' ', ' ', '=', 'P', 'P', ' ', ' ', ' ', '='],
+    ['=', ' ', ' ', ' ', 'P', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '=', ' ', ' ', 'P', 'P', ' ', '='],
+    ['=', ' ', ' ', ' ', 'P', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '=', '=', ' ', 'P', 'P', ' ', '='],
+    ['=', ' ', ' ', ' ', 'P', ' ', ' ', 'P', ' ', ' ', ' ', ' ', '=', '=', '=', ' ', ' ', ' ', '='],
+    ['=', 'P', '=', '=', '=', '=', ' ', ' ', '=', ' ', ' ', ' ', '=', '=', ' ', ' ', ' ', 'P', '='],
+    ['=', ' ', '=', ' ', ' ', '=', ' ', '=', '=', ' ', ' ', ' ', '=', ' ', ' ', ' ', ' ', ' ', '='],
+    ['=', ' ', '=', ' ', ' ', '=', ' ', '=', '=', 'P', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '='],
+    ['=', ' ', '=', '=', ' ', '=', ' ', ' ', '=', '=', 'F', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '='],
+    ['=', ' ', '=', '=', ' ', '=', ' ', ' ', '=', '=', 'P', ' ', ' ', ' ', ' ', ' ', ' ', '=', '='],
+    ['=', 'P', '=', ' ', ' ', '=', ' ', '=', '=', 'P', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '=', '='],
+    ['=', ' ', '=', ' ', ' ', '=', ' ', '=', '=', ' ', ' ', ' ', ' ', '=', ' ', 'P', '=', 'P', '='],
+    ['=', ' ', ' ', ' ', 'P', 'P', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '=', ' ', '=', ' ', ' ', '='],
+    ['=', ' ', ' ', ' ', 'P', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '=', '=', '=', ' ', ' ', ' ', '='],
+    ['=', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '=', '=', ' ', ' ', ' ', '='],
+    ['=', ' ', ' ', ' ', ' ', '=', '=', ' ', 'P', ' ', ' ', ' ', ' ', '=', ' ', ' ', ' ', ' ', '='],
+    ['=', ' ', 'P', ' ', ' ', '=', '=', ' ', 'P', ' ', ' ', ' ', ' ', '=', ' ', ' ', ' ', ' ', '='],
+    ['=', ' ', 'P', ' ', ' ', ' ', ' ', ' ', '=', '=', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '='],
+    ['=', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '=', '=', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', '='],
+    ['=', 'S', ' ', ' ', ' ', 'P', ' ', ' ', '=', '=', 'P', ' ', ' ', ' ', ' ', ' ', ' ', 'S', '='],
+    ['=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=', '=']]
+
+
+def random_map(rows, cols, agents, seed=None, wall_density=0.1, fires=1):
+    """ Seeded open map of the given size with a border wall, scattered walls, a safety spot in each corner,
+    fire seeds near the centre and the agents on random road cells """
+    rng = random.Random(seed)
+    game_map = [['=' if r in (0, rows - 1) or c in (0, cols - 1) or rng.random() < wall_density else ' ' for c in range(cols)] for r in range(rows)]
+    for r, c in [(1, 1), (1, cols - 2), (rows - 2, 1), (rows - 2, cols - 2)]:
+        game_map[r][c] = 'S'
+
+    road = [(r, c) for r in range(1, rows - 1) for c in range(1, cols - 1) if game_map[r][c] == ' ']
+    road.sort(key=lambda pos: abs(pos[0] - rows // 2) + abs(pos[1] - cols // 2))
+    for r, c in road[:fires]:
+        game_map[r][c] = 'F'
+    for r, c in rng.sample(road[fires:], min(agents, len(road) - fires)):
+        game_map[r][c] = 'P'
+
+    return game_map
+
+
+def parse_map(game_map):
+    """ Grid, agent positions, fire positions and safety positions of a map (rows of characters or a code array), in row-major order """
+    codes = np.ascontiguousarray(map_codes(game_map)) # Reads a memory-mapped map once
+
+    def positions(char):
+        return [tuple(position) for position in np.argwhere(codes == ord(char)).tolist()]
+
+    return Grid(codes), positions(AGENT), positions(FIRE), positions(SAFETY)
+
+
+def load_map(path):
+    """ Map code array of a text file (one line per row, one character per cell) or of a .npy file,
+    memory-mapped so only the pages that are read are loaded """
+    if path.endswith(".npy"):
+        return map_codes(np.load(path, mmap_mode='r'))
+
+    data = np.memmap(path, dtype=np.uint8, mode='r') if os.path.getsize(path) else np.zeros(0, dtype=np.uint8)
+    newlines = np.flatnonzero(data[:min(len(data), 1 << 20)] == ord('\n'))
+    if len(data) == 0 or len(newlines) == 0:
+        raise ValueError(f"{path}: a map needs at least one line ending with a newline")
+    stride = int(newlines[0]) + 1 # Bytes per line, newline included
+    cols = stride - 1 - (stride > 1 and data[stride - 2] == ord('\r'))
+    rows = (len(data) + 1) // stride # The last newline is optional
+    if len(data) not in (rows * stride, rows * stride - 1) or (data[stride - 1::stride] != ord('\n')).any():
+        raise ValueError(f"{path}: every line of a map must have the same length")
+
+    return np.lib.stride_tricks.as_strided(data, shape=(rows, cols), strides=(stride, 1), writeable=False)
+
+
+def save_map(path, game_map):
+    """ Write the map as a .npy code array, or as text for any other extension """
+    codes = map_codes(game_map)
+    if path.endswith(".npy"):
+        np.save(path, np.ascontiguousarray(codes))
+        return
+    lines = np.empty((codes.shape[0], codes.shape[1] + 1), dtype=np.uint8)
+    lines[:, :-1] = codes
+    lines[:, -1] = ord('\n')
+    lines.tofile(path)
+
+
+def building_map(rows, cols, seed=None, occupancy=0.02, fires=1, exits=4, room_size=(4, 10), corridor_width=2, wing_width=(40, 80)):
+    """ Seeded building-like map code array: horizontal corridors, each with a band of rooms above and below
+    (one door per room), vertical corridors every wing_width columns, exits on the outer wall at the corridor ends,
+    occupants in the rooms with the given density and fire seeds in random rooms """
+    rng = np.random.default_rng(seed)
+    codes = np.full((rows, cols), ord(WALL), dtype=np.uint8)
+    road = np.zeros((rows, cols), dtype=bool)
+    rooms = np.zeros((rows, cols), dtype=bool)
+    corridor_rows = []
+
+    def room_band(top, bottom, door_row):
+        """ Rooms over rows top..bottom-1, separated by walls, with a door on door_row each """
+        rooms[top:bottom, 1:cols - 1] = True
+        widths = rng.integers(room_size[0], room_size[1] + 1, size=cols // room_size[0] + 1)
+        walls = np.cumsum(widths + 1)
+        walls = walls[walls < cols - 2]
+        rooms[top:bottom, walls] = False
+        starts = np.concatenate(([1], walls + 1))
+        ends = np.concatenate((walls, [cols - 1])) # Exclusive
+        doors = starts + (rng.random(len(starts)) * (ends - starts)).astype(np.int64)
+        road[door_row, doors] = True
+
+    def band_height(row):
+        """ Random room height, cut to the rows left (0 if none is) """
+        return max(0, min(int(rng.integers(room_size[0], room_size[1] + 1)), rows - 1 - row))
+
+    # Rows: corridor, wall, band of rooms, wall, band of rooms, wall, corridor, ...
+    row = 1
+    while row + corridor_width <= rows - 1:
+        road[row:row + corridor_width, 1:cols - 1] = True
+        corridor_rows.append(row)
+        row += corridor_width + 1
+        height = band_height(row)
+        if height == 0:
+            break
+        room_band(row, row + height, row - 1) # Doors up to the corridor
+        row += height + 1
+        height = band_height(row)
+        if height == 0:
+            break
+        below = row + height + 1 + corridor_width <= rows - 1 # Another corridor fits below
+        room_band(row, row + height, row + height if below else row - 1) # Doors down to the next corridor, or up into the other band
+        row += height + 1
+
+    # Vertical corridors at both ends and every wing, joining the horizontal ones
+    corridor_cols = [1, cols - 1 - corridor_width]
+    col = 1
+    while True:
+        col += int(rng.integers(wing_width[0], wing_width[1] + 1))
+        if col + corridor_width >= cols - 1 - corridor_width:
+            break
+        corridor_cols.append(col)
+    for col in corridor_cols:
+        road[1:rows - 1, max(col, 1):col + corridor_width] = True
+
+    road |= rooms
+    codes[road] = ord(ROAD)
+
+    # Exits on the outer wall at the ends of the corridors
+    candidates = [(r, 0) for r in corridor_rows] + [(r, cols - 1) for r in corridor_rows] \
+        + [(0, c) for c in corridor_cols] + [(rows - 1, c) for c in corridor_cols]
+    for index in rng.choice(len(candidates), size=min(exits, len(candidates)), replace=False):
+        codes[candidates[index]] = ord(SAFETY)
+
+    # Occupants and fire seeds in the rooms
+    rooms &= road
+    occupants = rooms & (rng.random((rows, cols), dtype=np.float32) < occupancy)
+    codes[occupants] = ord(AGENT)
+    free = np.flatnonzero(rooms & ~occupants)
+    codes.ravel()[rng.choice(free, size=min(fires, len(free)), replace=False)] = ord(FIRE)
+
+    return codes
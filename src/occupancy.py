@@ -0,0 +1,118 @@
+import numpy as np
+
+
+class Occupancy:
+    """ Number of agents in every cell of the map with an optional per-cell capacity
+
+    The counts are a flat array (row * cols + col) updated by the moves only, so keeping them costs O(moves)
+    per tick and never a pass over the map. The agent objects are also indexed by cell, which makes
+    "who is in this cell or region" (fire deaths, congestion) a dictionary lookup.
+    A capacity of 0 means unlimited, and the safety cells (exits) never fill up.
+    """
+    def __init__(self, grid, capacity=0, safety_positions=()):
+        self.cols = grid.cols
+        self.capacity = capacity
+        self.counts = np.zeros(grid.rows * grid.cols, dtype=np.int32)
+        self.members = {} # Flat cell -> set of the agent objects in it
+        self.unlimited = np.zeros(grid.rows * grid.cols, dtype=bool)
+        self.unlimited[[r * grid.cols + c for r, c in safety_positions]] = True
+
+    def __getstate__(self):
+        """ Pickled state: the counts only, the agent objects index is left out """
+        state = self.__dict__.copy()
+        state["members"] = {}
+        return state
+
+    def cell(self, position):
+        return position[0] * self.cols + position[1]
+
+    # Agent objects, one at a time
+    def add(self, agent, position):
+        cell = self.cell(position)
+        self.counts[cell] += 1
+        self.members.setdefault(cell, set()).add(agent)
+
+    def remove(self, agent, position):
+        cell = self.cell(position)
+        self.counts[cell] -= 1
+        members = self.members[cell]
+        members.discard(agent)
+        if not members:
+            del self.members[cell]
+
+    def move(self, agent, old_position, new_position):
+        if old_position != new_position:
+            self.remove(agent, old_position)
+            self.add(agent, new_position)
+
+    def count(self, position):
+        return int(self.counts[self.cell(position)])
+
+    def has_room(self, position):
+        """ Check if one more agent can enter the position """
+        cell = self.cell(position)
+        return self.capacity <= 0 or self.unlimited[cell] or self.counts[cell] < self.capacity
+
+    def agents_at(self, position):
+        """ Agent objects in the position (empty set if none) """
+        return self.members.get(self.cell(position), set())
+
+    def agents_in(self, positions):
+        """ Agent objects in any of the positions, e.g. a region or the newly ignited cells """
+        agents = []
+        for position in positions:
+            members = self.members.get(self.cell(position))
+            if members:
+                agents.extend(members)
+        return agents
+
+    def full_positions(self, positions):
+        """ The positions that cannot take one more agent """
+        return [position for position in positions if not self.has_room(position)]
+
+    # Flat cell arrays of the vectorized engine
+    def add_cells(self, cells):
+        np.add.at(self.counts, cells, 1)
+
+    def remove_cells(self, cells):
+        np.subtract.at(self.counts, cells, 1)
+
+    def resolve(self, current, proposed, passes=3):
+        """ Final cells of agents moving from the current to the proposed flat cells, without exceeding the capacity
+
+        The conflicts are resolved in bulk: the movers are shuffled, grouped by target cell, and the first ones of
+        every group take the free places of their target; the others stay. Cells left by the accepted movers free
+        places for the next pass, so a queue advances by up to `passes` agents per tick. The counts are updated.
+        """
+        final = current.copy()
+        pending = np.flatnonzero(proposed != current)
+        if self.capacity <= 0:
+            final[pending] = proposed[pending]
+            self.remove_cells(current[pending])
+            self.add_cells(proposed[pending])
+            return final
+
+        for _ in range(passes):
+            if pending.size == 0:
+                break
+            movers = pending[np.random.permutation(pending.size)] # Random priority within a target cell
+            movers = movers[np.argsort(proposed[movers], kind='stable')]
+            targets = proposed[movers]
+
+            # Rank of every mover within its target group
+            index = np.arange(movers.size)
+            starts = np.ones(movers.size, dtype=bool)
+            starts[1:] = targets[1:] != targets[:-1]
+            rank = index - np.maximum.accumulate(np.where(starts, index, 0))
+
+            room = np.where(self.unlimited[targets], movers.size, self.capacity - self.counts[targets])
+            accepted = rank < room
+            if not accepted.any():
+                break
+            moved = movers[accepted]
+            final[moved] = proposed[moved]
+            self.remove_cells(current[moved])
+            self.add_cells(proposed[moved])
+            pending = movers[~accepted]
+
+        return final
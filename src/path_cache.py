@@ -0,0 +1,102 @@
+class PathCache:
+    """ Routes planned by the A* agents, indexed by the cells they go through, shared by all the AStar agents
+
+    Every agent has a key and at most one route (positions from the goal to its next step). A route stays valid until
+    the fire ignites one of its cells or a cell next to it: after every spread the game passes the newly ignited
+    positions and only the routes found through the position -> keys index are dropped. The cells of the valid routes
+    also keep their distance to the goal, so a search towards the same goal can follow the rest of a route.
+
+    The routes stored or dropped during a tick are only committed at the end of the tick (before the fire spreads), so
+    every decision of a tick sees the same routes whatever the order or the process the agents are moved in.
+
+    The cache also keeps the positions every search avoids (the burning cells and the cells next to them), grown with
+    the newly ignited positions at every spread instead of being rebuilt from the whole fire by every search.
+    """
+    def __init__(self, grid, fire_positions=()):
+        self.grid = grid
+        self.blocked = set() # Burning positions and the positions next to them
+        self.keys = 0 # Number of keys handed out
+        self.records = {} # Key -> (goal, route) of the committed routes
+        self.users = {} # Position -> set of the keys of the routes going through it
+        self.routes = {} # Goal -> {position: (distance to the goal, next position, key of the route)}
+        self.pending = [] # (key, goal, route) changes of the tick, route None to drop
+        self.ignite(fire_positions)
+
+    def register(self):
+        """ Key of a new agent """
+        self.keys += 1
+        return self.keys - 1
+
+    def has_route(self, key):
+        return key in self.records
+
+    def routes_to(self, goal):
+        """ Position -> (distance, next position, key) of the valid routes to the goal """
+        return self.routes.get(goal, {})
+
+    def follow(self, goal, position):
+        """ Positions after the given one along the routes to the goal (None if a route broke off) """
+        routes = self.routes.get(goal, {})
+        positions = []
+        while position != goal:
+            entry = routes.get(position)
+            if entry is None:
+                return None
+            position = entry[1]
+            positions.append(position)
+        return positions
+
+    def store(self, key, goal, route):
+        """ Replace the route of the key at the end of the tick (route from the goal to the next step) """
+        self.pending.append((key, goal, tuple(route)))
+
+    def drop(self, key):
+        """ Drop the route of the key at the end of the tick """
+        self.pending.append((key, None, None))
+
+    def take_pending(self):
+        changes, self.pending = self.pending, []
+        return changes
+
+    def commit(self, changes=None):
+        """ Apply the changes of the tick in order (the pending ones by default) """
+        if changes is None:
+            changes = self.take_pending()
+        for key, goal, route in changes:
+            self.__remove(key)
+            if route is not None:
+                self.__add(key, goal, route)
+
+    def __add(self, key, goal, route):
+        self.records[key] = (goal, route)
+        routes = self.routes.setdefault(goal, {})
+        for distance, position in enumerate(route):
+            self.users.setdefault(position, set()).add(key)
+            routes[position] = (distance, route[distance - 1] if distance else None, key)
+
+    def __remove(self, key):
+        record = self.records.pop(key, None)
+        if record is None:
+            return
+        goal, route = record
+        routes = self.routes[goal]
+        for position in route:
+            users = self.users[position]
+            users.discard(key)
+            if not users:
+                del self.users[position]
+            entry = routes.get(position)
+            if entry is not None and entry[2] == key:
+                del routes[position]
+
+    def ignite(self, new_fire_positions):
+        """ Block the newly ignited positions and the positions next to them, and drop the routes going through them """
+        doomed = set()
+        for position in new_fire_positions:
+            self.blocked.add(position)
+            doomed.update(self.users.get(position, ()))
+            for _, neighbor in self.grid.valid_moves(position):
+                self.blocked.add(neighbor)
+                doomed.update(self.users.get(neighbor, ()))
+        for key in doomed:
+            self.__remove(key)
@@ -0,0 +1,68 @@
+import os
+import hashlib
+import numpy as np
+
+
+class PolicyCache:
+    """ On-disk cache of trained Q-tables stored as .npy files named after a content hash of the training inputs
+
+    Tables are loaded memory-mapped (read only) and the least recently used files are evicted
+    once the cache grows over max_bytes, by one evict() after storing a batch of tables.
+    """
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(grid, fire_positions, safety_positions, fire_ticks, **params):
+        """ Content hash of the map, the fire seeds, the goals, FIRE_TICKS and the training hyperparameters
+
+        The training mode (threads or processes) is left out by the caller: it does not change what a table learns.
+        """
+        digest = hashlib.sha256()
+        digest.update(np.asarray(grid.shape, dtype=np.int64).tobytes())
+        digest.update(grid.cells.tobytes())
+        digest.update(repr(sorted(fire_positions)).encode())
+        digest.update(repr(sorted(safety_positions)).encode())
+        digest.update(repr(fire_ticks).encode())
+        digest.update(repr(sorted(params.items())).encode())
+
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def load(self, key):
+        """ Memory-mapped Q-table stored under the key, or None on a cache miss """
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        os.utime(path) # Mark as recently used for the eviction
+        return np.load(path, mmap_mode='r')
+
+    def store(self, key, q_table):
+        """ Save the Q-table under the key (call evict() once the batch of tables is stored) """
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            np.save(file, np.asarray(q_table))
+        os.replace(tmp_path, path) # Atomic, so concurrent runs never read a partial file
+
+    def evict(self):
+        """ Remove the least recently used tables until the cache fits in max_bytes """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npy"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass # Already evicted by another run
+            total -= size
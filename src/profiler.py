@@ -0,0 +1,97 @@
+import json
+import os
+import time
+import numpy as np
+
+# Upper bounds (microseconds) of the latency histogram buckets, the last bucket is open
+HISTOGRAM_BOUNDS_US = [2 ** i for i in range(25)]
+
+
+class Profiler:
+    """ Instrumentation of a game: timed spans around the agent decisions, the fire and the rendering, and per-tick counters
+
+    The game only calls it when profiling is on, so a game without a profiler pays a single None check per hook.
+    Spans are kept as (name, tick, agent, start, duration) and exported as JSON lines or in the Chrome trace format
+    (chrome://tracing, Perfetto).
+    """
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans = [] # (name, tick, agent, start, duration) in seconds from the origin
+        self.ticks = [] # Counters of every tick
+        self.latencies = {} # Span name -> list of durations (seconds)
+        self.agent_indices = {} # id() of each agent -> index in order of first appearance
+
+    def agent_index(self, agent):
+        """ Small stable index of an agent for the trace rows """
+        return self.agent_indices.setdefault(id(agent), len(self.agent_indices))
+
+    @staticmethod
+    def now():
+        return time.perf_counter()
+
+    def record(self, name, start, tick, agent=None):
+        """ Record a span started at start (a now() value) and ending now """
+        duration = time.perf_counter() - start
+        self.spans.append((name, tick, agent, start - self.origin, duration))
+        self.latencies.setdefault(name, []).append(duration)
+
+    def count(self, tick, **counters):
+        """ Record the counters of a tick (simulations, nodes expanded, fire frontier size, ...) """
+        self.ticks.append({"tick": tick, **counters})
+
+    def histogram(self, name):
+        """ Counts of the span durations in the HISTOGRAM_BOUNDS_US buckets (one more for the slower ones) """
+        durations_us = np.asarray(self.latencies.get(name, []), dtype=np.float64) * 1e6
+        return np.bincount(np.searchsorted(HISTOGRAM_BOUNDS_US, durations_us), minlength=len(HISTOGRAM_BOUNDS_US) + 1).tolist()
+
+    def summary(self):
+        """ Latency statistics (milliseconds) and histogram of every span name """
+        summary = {}
+        for name, durations in self.latencies.items():
+            durations_ms = np.asarray(durations) * 1e3
+            summary[name] = {
+                "count": len(durations),
+                "total_ms": float(durations_ms.sum()),
+                "mean_ms": float(durations_ms.mean()),
+                "p50_ms": float(np.percentile(durations_ms, 50)),
+                "p90_ms": float(np.percentile(durations_ms, 90)),
+                "p99_ms": float(np.percentile(durations_ms, 99)),
+                "max_ms": float(durations_ms.max()),
+                "histogram_us": {"bounds": HISTOGRAM_BOUNDS_US, "counts": self.histogram(name)},
+            }
+        return summary
+
+    def write_jsonl(self, file):
+        """ One JSON object per line: the spans, the tick counters, then the summary """
+        for name, tick, agent, start, duration in self.spans:
+            file.write(json.dumps({"type": "span", "name": name, "tick": tick, "agent": agent, "start_us": start * 1e6, "duration_us": duration * 1e6}) + "\n")
+        for counters in self.ticks:
+            file.write(json.dumps({"type": "tick", **counters}) + "\n")
+        file.write(json.dumps({"type": "summary", "latency": self.summary()}) + "\n")
+
+    def write_chrome_trace(self, file):
+        """ Chrome trace: one complete event per span (one thread row per agent) and the counters as counter events """
+        events = []
+        for name, tick, agent, start, duration in self.spans:
+            events.append({
+                "name": name, "ph": "X", "ts": start * 1e6, "dur": duration * 1e6,
+                "pid": 0, "tid": 0 if agent is None else agent + 1, "args": {"tick": tick},
+            })
+        tick_starts = {}
+        for name, tick, _, start, _ in self.spans:
+            tick_starts.setdefault(tick, start)
+        for counters in self.ticks:
+            ts = tick_starts.get(counters["tick"], 0) * 1e6
+            events.append({
+                "name": "counters", "ph": "C", "ts": ts, "pid": 0,
+                "args": {key: value for key, value in counters.items() if key != "tick"},
+            })
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def export(self, path):
+        """ Write the profile to path: JSON lines for a .jsonl file, Chrome trace otherwise """
+        with open(path, "w") as file:
+            if os.path.splitext(path)[1] == ".jsonl":
+                self.write_jsonl(file)
+            else:
+                self.write_chrome_trace(file)
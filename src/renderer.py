@@ -0,0 +1,184 @@
+import os
+import shutil
+import sys
+import time
+import numpy as np
+from src.agent_base import WALL
+
+
+class Renderer:
+    """ Base renderer: decides whether and how a game frame is drawn (draws nothing) """
+    def __init__(self, delay=0.0):
+        self.delay = delay # Seconds to sleep after each drawn frame
+
+    def should_draw(self, game):
+        """ Check if the current tick has to be drawn """
+        return False
+
+    def draw(self, game):
+        """ Draw one frame of the game """
+        pass
+
+    def render(self, game):
+        """ Called by the game after every tick """
+        if self.should_draw(game):
+            self.draw(game)
+            if self.delay:
+                time.sleep(self.delay)
+
+    def finish(self, game):
+        """ Called once when the game is ended """
+        pass
+
+
+class NullRenderer(Renderer):
+    """ Headless mode: nothing is drawn and the game never sleeps """
+    pass
+
+
+class TerminalRenderer(Renderer):
+    """ Clear the terminal and print the whole map every tick """
+    def __init__(self, delay=0.5):
+        super().__init__(delay)
+
+    def should_draw(self, game):
+        return True
+
+    def draw(self, game):
+        # Clear the terminal
+        os.system('cls' if os.name == 'nt' else 'clear')
+        game.print_game()
+
+    def finish(self, game):
+        print(f"Game ended")
+        print(f"With {game.agent_num} Agents")
+
+
+class EveryNthRenderer(TerminalRenderer):
+    """ Print the map only every n-th tick """
+    def __init__(self, every=10, delay=0.0):
+        super().__init__(delay)
+        self.every = max(1, every)
+
+    def should_draw(self, game):
+        return game.ticks % self.every == 0
+
+
+class FinalFrameRenderer(Renderer):
+    """ Print only the last frame of the game """
+    def finish(self, game):
+        game.print_game()
+        print(f"Game ended")
+        print(f"With {game.agent_num} Agents")
+
+
+class DiffRenderer(Renderer):
+    """ Keep the previous frame and rewrite only the changed cells with ANSI cursor positioning, in one write per tick
+
+    A viewport (top, left, height, width) shows part of the map, and a scale of n shows every n x n block
+    as one cell (the most important content of the block). A scale of 0 fits the map to the terminal.
+    """
+    # Cell content codes, ordered by what a cell (or a downsampled block) shows first
+    ROAD_CODE, WALL_CODE, AGENT_CODE, FIRE_CODE, SAFETY_CODE = range(5)
+    CHARS = np.array([' ', WALL, 'P', 'F', 'S'])
+
+    def __init__(self, viewport=None, scale=0, delay=0.0, out=None):
+        super().__init__(delay)
+        self.viewport = viewport
+        self.scale = scale
+        self.out = out if out is not None else sys.stdout
+        self.game = None # Game the state below belongs to
+
+    def should_draw(self, game):
+        return True
+
+    def __start(self, game):
+        """ Reset the frame state for a new game """
+        self.game = game
+        self.base = np.where(game.grid.wall_mask.ravel(), self.WALL_CODE, self.ROAD_CODE).astype(np.uint8)
+        self.burning = np.zeros(game.grid.rows * game.grid.cols, dtype=bool)
+        self.rings_seen = 0
+        self.safety = np.array([r * game.grid.cols + c for r, c in game.safety_positions], dtype=np.int64)
+        self.previous = None
+
+        rows, cols = game.grid.rows, game.grid.cols
+        top, left, height, width = self.viewport or (0, 0, rows, cols)
+        self.window = (slice(max(0, top), min(rows, top + height)), slice(max(0, left), min(cols, left + width)))
+        self.step = self.scale
+        if self.step <= 0:
+            # Fit the window (two terminal columns per cell) under the status line
+            size = shutil.get_terminal_size((80, 24))
+            height = self.window[0].stop - self.window[0].start
+            width = self.window[1].stop - self.window[1].start
+            self.step = max(1, -(-height // max(1, size.lines - 3)), -(-2 * width // max(1, size.columns)))
+
+    def frame(self, game):
+        """ uint8 array of the content code of every shown cell """
+        for ring in game.fire.rings[self.rings_seen:]:
+            self.burning[[r * game.grid.cols + c for r, c in ring]] = True
+        self.rings_seen = len(game.fire.rings)
+
+        codes = self.base.copy()
+        codes[game.agent_cells()] = self.AGENT_CODE
+        codes[self.burning] = self.FIRE_CODE
+        codes[self.safety] = self.SAFETY_CODE
+        codes = codes.reshape(game.grid.rows, game.grid.cols)[self.window]
+
+        if self.step > 1:
+            # Keep the highest code of every step x step block
+            step = self.step
+            height, width = -(-codes.shape[0] // step) * step, -(-codes.shape[1] // step) * step
+            padded = np.zeros((height, width), dtype=np.uint8)
+            padded[:codes.shape[0], :codes.shape[1]] = codes
+            codes = padded.reshape(height // step, step, width // step, step).max(axis=(1, 3))
+        return codes
+
+    def draw(self, game):
+        if game is not self.game:
+            self.__start(game)
+        codes = self.frame(game)
+
+        parts = [f"\x1b[1;1HTicks: {game.ticks}, Safe: {game.safe}, Dead: {game.dead}, Objective Function: {game.total_distance_traveled}\x1b[K"]
+        if self.previous is None or self.previous.shape != codes.shape:
+            # First frame: clear the screen and hide the cursor, then draw every cell
+            parts.insert(0, "\x1b[?25l\x1b[2J")
+            parts += [f"\x1b[{row + 2};1H" + " ".join(line) + " " for row, line in enumerate(self.CHARS[codes].tolist())]
+        else:
+            rows, cols = np.nonzero(codes != self.previous)
+            chars = self.CHARS[codes[rows, cols]]
+            parts += [f"\x1b[{row + 2};{2 * col + 1}H{char}" for row, col, char in zip(rows.tolist(), cols.tolist(), chars.tolist())]
+        self.previous = codes
+
+        self.out.write("".join(parts))
+        self.out.flush()
+
+    def finish(self, game):
+        if self.previous is not None:
+            # Put the cursor back under the map
+            self.out.write(f"\x1b[{self.previous.shape[0] + 2};1H\x1b[?25h")
+            self.out.flush()
+        print(f"Game ended")
+        print(f"With {game.agent_num} Agents")
+
+
+RENDERERS = {
+    "none": NullRenderer,
+    "terminal": TerminalRenderer,
+    "every": EveryNthRenderer,
+    "final": FinalFrameRenderer,
+    "diff": DiffRenderer,
+}
+
+
+def make_renderer(render="terminal", render_every=10, viewport=None, scale=0):
+    """ Build a renderer from its name (none, terminal, every, final, diff) or return the given renderer """
+    if isinstance(render, Renderer):
+        return render
+    if render not in RENDERERS:
+        raise ValueError(f"Unknown renderer: {render}")
+    if render == "every":
+        return EveryNthRenderer(every=render_every)
+    if render == "diff":
+        return DiffRenderer(viewport=viewport, scale=scale)
+
+    return RENDERERS[render]()
@@ -0,0 +1,179 @@
+"""
+Streaming replay log of a game and the offline replay command
+
+The log is JSON lines (gzip-compressed if the path ends with .gz) written through a buffered writer:
+  header: {"type": "header", "rows", "cols", "walls" (base64 of the packed wall mask), "agents", "fire", "safety", "fire_ticks"}
+          with the agents (in id order), the fire seeds and the safety positions as flat cell indices (row * cols + col)
+  tick:   {"t": tick, "m": [id, cell, id, cell, ...], "i": [cells], "s": [ids], "d": [ids]}
+          the agents moved, the cells ignited, the agents saved and the agents dead during the tick (empty keys are left out)
+  end:    {"type": "end", "ticks", "safe", "dead"}
+
+Usage: python -m src.replay LOG [--tick N | --start A --end B --every K]
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import time
+import numpy as np
+from src.agent_base import WALL
+from src.crowd import DEAD, ALIVE, SAFE
+
+
+def open_log(path, mode):
+    """ Text file of the log (gzip-compressed for a .gz path), written through a large buffer """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", compresslevel=6)
+    return open(path, mode, buffering=1 << 20)
+
+
+class ReplayWriter:
+    """ Write the per-tick deltas of a game to a replay log """
+    def __init__(self, path, grid, agent_positions, fire_positions, safety_positions, fire_ticks):
+        self.cols = grid.cols
+        self.file = open_log(path, "w")
+        self.write({
+            "type": "header", "rows": grid.rows, "cols": grid.cols,
+            "walls": base64.b64encode(np.packbits(grid.wall_mask.ravel()).tobytes()).decode(),
+            "agents": self.cells(agent_positions), "fire": self.cells(fire_positions), "safety": self.cells(safety_positions),
+            "fire_ticks": fire_ticks,
+        })
+
+    def cells(self, positions):
+        return [r * self.cols + c for r, c in positions]
+
+    def write(self, record):
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def tick(self, tick, moved=(), ignited=(), saved=(), dead=()):
+        """ Write the deltas of a tick: moved (agent id, (row, col)) pairs, ignited (row, col) positions, saved and dead agent ids """
+        record = {"t": tick}
+        if moved:
+            record["m"] = [value for agent, (r, c) in moved for value in (agent, r * self.cols + c)]
+        if ignited:
+            record["i"] = self.cells(ignited)
+        if saved:
+            record["s"] = list(saved)
+        if dead:
+            record["d"] = list(dead)
+        self.write(record)
+
+    def close(self, ticks, safe, dead):
+        self.write({"type": "end", "ticks": ticks, "safe": safe, "dead": dead})
+        self.file.close()
+
+
+class Replay:
+    """ Game rebuilt from a replay log, with the state after any tick
+
+    The deltas are kept in memory and the state is checkpointed every checkpoint_every ticks,
+    so seeking to a tick only replays the deltas since the previous checkpoint.
+    """
+    def __init__(self, path, checkpoint_every=100):
+        self.records = []
+        self.end = None
+        with open_log(path, "r") as file:
+            self.header = json.loads(file.readline())
+            for line in file:
+                record = json.loads(line)
+                if record.get("type") == "end":
+                    self.end = record
+                else:
+                    self.records.append(record)
+
+        self.rows, self.cols = self.header["rows"], self.header["cols"]
+        walls = np.frombuffer(base64.b64decode(self.header["walls"]), dtype=np.uint8)
+        self.wall_mask = np.unpackbits(walls)[:self.rows * self.cols].astype(bool).reshape(self.rows, self.cols)
+        self.checkpoint_every = checkpoint_every
+        self.checkpoints = {0: self.__initial_state()}
+
+    @property
+    def ticks(self):
+        """ Number of ticks in the log """
+        return len(self.records)
+
+    def __initial_state(self):
+        agents = len(self.header["agents"])
+        return {
+            "positions": np.array(self.header["agents"], dtype=np.int64).reshape(agents),
+            "status": np.full(agents, ALIVE, dtype=np.int8),
+            "burning": np.array(self.header["fire"], dtype=np.int64),
+            "ignited": [],
+        }
+
+    @staticmethod
+    def __apply(state, record):
+        """ State after the deltas of one tick (the state is updated in place) """
+        moved = record.get("m")
+        if moved:
+            moved = np.array(moved, dtype=np.int64).reshape(-1, 2)
+            state["positions"][moved[:, 0]] = moved[:, 1]
+        if "i" in record:
+            state["ignited"].append(np.array(record["i"], dtype=np.int64))
+        if "s" in record:
+            state["status"][record["s"]] = SAFE
+        if "d" in record:
+            state["status"][record["d"]] = DEAD
+        return state
+
+    @staticmethod
+    def __copy(state):
+        return {
+            "positions": state["positions"].copy(),
+            "status": state["status"].copy(),
+            "burning": np.concatenate([state["burning"], *state["ignited"]]),
+            "ignited": [],
+        }
+
+    def state(self, tick):
+        """ Agent positions and status, and burning cells after the given number of ticks """
+        tick = max(0, min(tick, self.ticks))
+        start = max(checkpoint for checkpoint in self.checkpoints if checkpoint <= tick)
+        state = self.__copy(self.checkpoints[start])
+        for t in range(start, tick):
+            self.__apply(state, self.records[t])
+            if (t + 1) % self.checkpoint_every == 0 and t + 1 not in self.checkpoints:
+                self.checkpoints[t + 1] = self.__copy(state)
+        return self.__copy(state)
+
+    def frame(self, tick):
+        """ Text of the map after the given number of ticks, in the Game.print_game format """
+        state = self.state(tick)
+        chars = np.where(self.wall_mask, WALL, ' ').ravel()
+        chars[state["positions"][state["status"] == ALIVE]] = 'P'
+        chars[state["burning"]] = 'F'
+        chars[self.header["safety"]] = 'S'
+        safe = int(np.count_nonzero(state["status"] == SAFE))
+        dead = int(np.count_nonzero(state["status"] == DEAD))
+        lines = [f"Ticks: {min(tick, self.ticks)}, Safe: {safe}, Dead: {dead}"]
+        lines += [" ".join(row) + " " for row in chars.reshape(self.rows, self.cols).tolist()]
+        return "\n".join(lines)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay a game from its replay log")
+
+    parser.add_argument("log", type=str, help="Replay log written with --replay")
+    parser.add_argument("--tick", type=int, default=None, help="Render the map after this tick only (seek)")
+    parser.add_argument("--start", type=int, default=0, help="First tick played")
+    parser.add_argument("--end", type=int, default=None, help="Last tick played (default: the last one)")
+    parser.add_argument("--every", type=int, default=1, help="Play every n-th tick")
+    parser.add_argument("--delay", type=float, default=0.5, help="Seconds between the played frames")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    replay = Replay(args.log)
+    if args.tick is not None:
+        print(replay.frame(args.tick))
+    else:
+        end = replay.ticks if args.end is None else args.end
+        for tick in range(args.start, end + 1, max(1, args.every)):
+            os.system('cls' if os.name == 'nt' else 'clear')
+            print(replay.frame(tick))
+            time.sleep(args.delay)
+    if replay.end is not None:
+        print(f"Game ended after {replay.end['ticks']} ticks: Safe: {replay.end['safe']}, Dead: {replay.end['dead']}")
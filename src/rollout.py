@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class BatchRollout:
+    """ Rollout engine that advances a whole batch of MCTS random walks at once, shared by all MCTS agents
+
+    Walks use the grid neighbour table, and rewards (same formula as AgentMCTS.compute_reward)
+    come from the shared RewardFields lookups of the nearest safety and fire distances.
+    """
+    def __init__(self, grid, safety_positions, reward_fields, fire_forecast=None):
+        self.rows, self.cols = grid.rows, grid.cols
+        self.neighbors = grid.neighbors.reshape(-1, grid.neighbors.shape[-1]).astype(np.int64)
+        self.safety_mask = np.zeros(self.rows * self.cols, dtype=bool)
+        self.safety_mask[[r * self.cols + c for r, c in safety_positions]] = True
+        self.reward_fields = reward_fields # Kept up to date with the fire by the game
+        self.arrival = fire_forecast.arrival.ravel() if fire_forecast is not None else None
+
+    def rewards(self, cells, ticks):
+        """ Reward of standing on each cell at each tick """
+        fire_distance = self.reward_fields.fire.distances[cells].astype(np.float64)
+        reward = 10 - self.reward_fields.safety[cells].astype(np.float64) + fire_distance - 5
+        safe = self.safety_mask[cells]
+        burning = fire_distance == 0
+        if self.arrival is not None:
+            burning |= self.arrival[cells] <= ticks
+        reward[safe] += 100 # Reached safety
+        reward[~safe & burning] -= 100 # Got burned
+        return reward
+
+    def simulate(self, positions, depth, start_ticks):
+        """ Random rollouts from each (row, col) position reached at the matching start tick, like AgentMCTS.simulate """
+        cells = np.array([r * self.cols + c for r, c in positions], dtype=np.int64)
+        ticks = np.asarray(start_ticks, dtype=np.int64)
+        results = np.zeros(len(cells))
+        totals = np.zeros(len(cells))
+        active = np.arange(len(cells)) # Walks that are still going
+
+        for step in range(depth):
+            if active.size == 0:
+                break
+            neighbors = self.neighbors[cells[active]]
+            valid = neighbors >= 0
+
+            stuck = ~valid.any(axis=1)
+            results[active[stuck]] = -10 # Negative reward for being stuck
+            active, neighbors, valid = active[~stuck], neighbors[~stuck], valid[~stuck]
+
+            # Take a random valid action in every walk
+            scores = np.random.random(neighbors.shape)
+            scores[~valid] = -1
+            cells[active] = neighbors[np.arange(len(active)), np.argmax(scores, axis=1)]
+
+            reward = self.rewards(cells[active], ticks[active] + step + 1)
+            ended = (reward >= 100) | (reward <= -100)
+            results[active[ended]] = reward[ended] * depth # End simulation if safety or fire is reached
+            totals[active[~ended]] += reward[~ended] * depth
+            active = active[~ended]
+
+        results[active] = totals[active]
+        return results
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from src.distance_field import FireDistanceField, nearest_distance
+from src.fire import Fire
+from src.maps import DEFAULT_MAP, parse_map
+
+
+def flat_cells(grid, positions):
+    return [r * grid.cols + c for r, c in positions]
+
+
+@pytest.mark.parametrize("walkable", [False, True])
+def test_ignite_matches_recomputed_field(walkable):
+    grid, _, fire_positions, _ = parse_map(DEFAULT_MAP)
+    fire = Fire(grid, fire_positions) # Burns through walls, so walkable fields also start from wall cells
+    field = FireDistanceField(grid, fire_positions, walkable=walkable)
+    open_mask = ~grid.wall_mask.ravel() if walkable else None
+    for _ in range(8):
+        field.ignite(fire.expand())
+        expected = nearest_distance(grid.rows, grid.cols, flat_cells(grid, fire.fire_positions), open_mask)
+        np.testing.assert_array_equal(field.distances, expected)
+
+
+def test_ignite_of_separate_fires():
+    grid, _, _, _ = parse_map(DEFAULT_MAP)
+    field = FireDistanceField(grid, [(1, 1)], walkable=True)
+    burning = {(1, 1)}
+    for ignited in ({(21, 17)}, {(1, 17), (21, 1)}, {(10, 10), (10, 11)}):
+        field.ignite(ignited)
+        burning |= ignited
+        expected = nearest_distance(grid.rows, grid.cols, flat_cells(grid, burning), ~grid.wall_mask.ravel())
+        np.testing.assert_array_equal(field.distances, expected)
+
+
+@pytest.mark.parametrize("walkable", [False, True])
+def test_restore_rewinds_exactly(walkable):
+    grid, _, fire_positions, _ = parse_map(DEFAULT_MAP)
+    fire = Fire(grid, fire_positions)
+    field = FireDistanceField(grid, fire_positions, walkable=walkable).fork()
+    field.ignite(fire.expand())
+    before = field.distances.copy()
+    snapshot = field.snapshot()
+    for _ in range(5):
+        field.ignite(fire.expand())
+    assert not np.array_equal(field.distances, before)
+    field.restore(snapshot)
+    np.testing.assert_array_equal(field.distances, before)
+    field.restore(0)
+    np.testing.assert_array_equal(field.distances, FireDistanceField(grid, fire_positions, walkable=walkable).distances)
+
+
+def test_fork_leaves_the_field_unchanged():
+    grid, _, fire_positions, _ = parse_map(DEFAULT_MAP)
+    field = FireDistanceField(grid, fire_positions)
+    distances = field.distances.copy()
+    fork = field.fork()
+    fork.ignite(Fire(grid, fire_positions).expand())
+    np.testing.assert_array_equal(field.distances, distances)
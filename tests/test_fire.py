@@ -0,0 +1,41 @@
+import numpy as np
+from src.fire import Fire, FrontierFire
+from src.grid import Grid
+from src.maps import DEFAULT_MAP, parse_map
+
+
+def burn(fire, spreads):
+    """ Rings ignited by the seeds and the given number of spreads """
+    for _ in range(spreads):
+        fire.expand()
+    return [set(ring) for ring in fire.rings]
+
+
+def test_frontier_matches_classic_through_walls():
+    grid, _, fire_positions, _ = parse_map(DEFAULT_MAP)
+    spreads = grid.rows + grid.cols # Enough to burn the whole map
+    classic = burn(Fire(grid, fire_positions), spreads)
+    frontier = burn(FrontierFire(grid, fire_positions, walls_block=False), spreads)
+    assert classic == frontier
+    assert set().union(*classic) == {(r, c) for r in range(grid.rows) for c in range(grid.cols)}
+
+
+def test_frontier_matches_classic_without_walls():
+    _, _, fire_positions, _ = parse_map(DEFAULT_MAP)
+    grid = Grid(np.full(np.shape(DEFAULT_MAP), " ")) # The default map with its walls removed
+    spreads = grid.rows + grid.cols
+    assert burn(Fire(grid, fire_positions), spreads) == burn(FrontierFire(grid, fire_positions), spreads)
+
+
+def test_restore_rewinds_both_engines():
+    grid, _, fire_positions, _ = parse_map(DEFAULT_MAP)
+    for fire in (Fire(grid, fire_positions), FrontierFire(grid, fire_positions, walls_block=False)):
+        burn(fire, 3)
+        snapshot = fire.snapshot()
+        rings = [set(ring) for ring in fire.rings]
+        burn(fire, 4)
+        fire.restore(snapshot)
+        assert [set(ring) for ring in fire.rings] == rings
+        assert fire.fire_positions == set().union(*rings)
+        # The rewound fire spreads like a fresh one
+        assert burn(fire, 2) == burn(Fire(grid, fire_positions), 5)
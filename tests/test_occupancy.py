@@ -0,0 +1,71 @@
+import random
+import numpy as np
+import pytest
+from src.game import Game
+from src.grid import Grid
+from src.maps import DEFAULT_MAP
+from src.occupancy import Occupancy
+
+
+def occupancy_of(current, capacity, safety_positions=(), shape=(3, 5)):
+    grid = Grid(np.full(shape, " "))
+    occupancy = Occupancy(grid, capacity, safety_positions)
+    occupancy.add_cells(current)
+    return occupancy
+
+
+def test_resolve_fills_a_cell_up_to_the_capacity():
+    np.random.seed(0)
+    current = np.array([0, 2, 6, 8, 10])
+    proposed = np.full(5, 7) # Everyone moves into the middle cell (1, 2)
+    occupancy = occupancy_of(current, capacity=2)
+    final = occupancy.resolve(current, proposed)
+    moved = final != current
+    assert moved.sum() == 2
+    assert (final[moved] == 7).all()
+    assert (final[~moved] == current[~moved]).all() # The others wait in place
+    np.testing.assert_array_equal(occupancy.counts, np.bincount(final, minlength=15))
+    assert not occupancy.has_room((1, 2))
+
+
+def test_resolve_never_fills_an_exit():
+    np.random.seed(0)
+    current = np.array([0, 2, 6, 8, 10, 7]) # The last agent already stands on the exit
+    proposed = np.full(6, 7)
+    occupancy = occupancy_of(current, capacity=1, safety_positions=[(1, 2)])
+    final = occupancy.resolve(current, proposed)
+    assert (final == 7).all()
+    assert occupancy.count((1, 2)) == 6
+    assert occupancy.has_room((1, 2))
+
+
+def test_resolve_lets_a_queue_advance():
+    np.random.seed(0)
+    current = np.array([0, 1, 2])
+    proposed = np.array([1, 2, 3]) # Each agent follows the next one, the head moves into a free cell
+    occupancy = occupancy_of(current, capacity=1)
+    final = occupancy.resolve(current, proposed, passes=3)
+    np.testing.assert_array_equal(final, proposed)
+    np.testing.assert_array_equal(occupancy.counts, np.bincount(final, minlength=15))
+
+
+def test_resolve_without_capacity_accepts_every_move():
+    current = np.array([0, 2, 6, 8])
+    proposed = np.full(4, 7)
+    occupancy = occupancy_of(current, capacity=0)
+    np.testing.assert_array_equal(occupancy.resolve(current, proposed), proposed)
+    assert occupancy.count((1, 2)) == 4
+
+
+@pytest.mark.parametrize("method, expected", [
+    # (ticks, saved, agents, objective) of the seeded games before the occupancy was added
+    ("Random", [(29, 1, 30, 2), (29, 6, 30, 73), (27, 6, 30, 104), (32, 2, 30, 17)]),
+    ("AStar", [(20, 30, 30, 254)] * 4),
+])
+def test_unlimited_capacity_matches_the_baseline(method, expected):
+    results = []
+    for seed in range(4):
+        random.seed(seed)
+        np.random.seed(seed)
+        results.append(Game(DEFAULT_MAP, method=method, render='none', capacity=0).run())
+    assert results == expected
@@ -0,0 +1,74 @@
+import os
+import numpy as np
+import pytest
+from src import game as game_module
+from src.game import Game, FIRE_TICKS
+from src.maps import DEFAULT_MAP, parse_map
+from src.policy_cache import PolicyCache
+
+
+def table(value, shape=(4, 4, 4)):
+    return np.full(shape, value, dtype=np.float32)
+
+
+def test_miss_then_hit(tmp_path):
+    cache = PolicyCache(str(tmp_path))
+    assert cache.load("missing") is None
+    cache.store("key", table(1.5))
+    loaded = cache.load("key")
+    np.testing.assert_array_equal(loaded, table(1.5))
+    assert not loaded.flags.writeable # Memory-mapped read only
+
+
+def test_key_follows_the_training_inputs():
+    grid, _, fire_positions, safety_positions = parse_map(DEFAULT_MAP)
+    key = PolicyCache.key(grid, fire_positions, safety_positions, FIRE_TICKS, episodes=10, start_position=(1, 6))
+    assert key == PolicyCache.key(grid, list(reversed(fire_positions)), safety_positions, FIRE_TICKS, episodes=10, start_position=(1, 6))
+    assert key != PolicyCache.key(grid, fire_positions, safety_positions, FIRE_TICKS, episodes=11, start_position=(1, 6))
+    assert key != PolicyCache.key(grid, fire_positions, safety_positions, FIRE_TICKS + 1, episodes=10, start_position=(1, 6))
+    assert key != PolicyCache.key(grid, [(2, 2)], safety_positions, FIRE_TICKS, episodes=10, start_position=(1, 6))
+
+
+def test_evict_removes_the_least_recently_used_tables(tmp_path):
+    size = os.path.getsize(_stored(PolicyCache(str(tmp_path / "probe")), "probe"))
+    cache = PolicyCache(str(tmp_path / "cache"), max_bytes=2 * size)
+    for age, key in enumerate(["new", "used", "old"]):
+        path = _stored(cache, key)
+        os.utime(path, (1000 - 100 * age, 1000 - 100 * age))
+    assert sorted(os.listdir(cache.directory)) == ["new.npy", "old.npy", "used.npy"] # store does not evict
+    cache.load("used") # Now the most recently used
+    cache.evict()
+    assert sorted(os.listdir(cache.directory)) == ["new.npy", "used.npy"]
+    cache.evict() # Already small enough
+    assert sorted(os.listdir(cache.directory)) == ["new.npy", "used.npy"]
+
+
+def _stored(cache, key):
+    cache.store(key, table(0))
+    return cache.path(key)
+
+
+def test_thread_and_process_training_share_the_tables(tmp_path, monkeypatch):
+    cache = PolicyCache(str(tmp_path))
+    trained = Game(DEFAULT_MAP, method='Qlearning', rollout=2, render='none', training='thread', policy_cache=cache)
+    stored = sorted(os.listdir(cache.directory))
+    assert len(stored) == len(set(parse_map(DEFAULT_MAP)[1])) # One table per start position
+
+    class NoTraining:
+        def __init__(self, *args, **kwargs):
+            raise AssertionError("the cached tables should have been used")
+
+    monkeypatch.setattr(game_module.concurrent.futures, "ProcessPoolExecutor", NoTraining)
+    cached = Game(DEFAULT_MAP, method='Qlearning', rollout=2, render='none', training='process', policy_cache=cache)
+    assert sorted(os.listdir(cache.directory)) == stored
+    for trained_agent, cached_agent in zip(trained.agents, cached.agents):
+        np.testing.assert_array_equal(trained_agent.q_table, cached_agent.q_table)
+
+
+@pytest.mark.parametrize("training", ["thread", "shared"])
+def test_game_evicts_once_after_storing(tmp_path, monkeypatch, training):
+    evictions = []
+    monkeypatch.setattr(PolicyCache, "evict", lambda self: evictions.append(len(os.listdir(self.directory))))
+    cache = PolicyCache(str(tmp_path))
+    Game(DEFAULT_MAP, method='Qlearning', rollout=2, render='none', training=training, policy_cache=cache)
+    assert evictions == [len(os.listdir(cache.directory))]